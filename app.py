@@ -1,16 +1,75 @@
 
-import io
+import asyncio
+import json
+import multiprocessing
+import os
 import re
-import pytesseract
-import easyocr
-from PIL import Image, ImageEnhance, ImageFilter
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from PIL import Image, ImageFilter
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from workers import WorkerPools, env_int
+from batching import MicroBatcher
+from cache import LabelCache, content_hash, is_content_hash
+from store import ResultStore
+from matcher import build_matcher
+from knowledge import DELIMITERS, IngredientIndex, load_knowledge_file
+from products import ProductCatalog, load_catalog_file
+from kbfile import KNOWLEDGE_FILE, KnowledgeFile, KnowledgeWatcher, compile_tables
+from ner_chunks import NerChunker
+import bulk
+from preprocess import PREPROCESS_STEPS, Preprocessor
+from ocr import OCR_ROI, ImageTooLarge, OcrRouter, OcrStats, find_label_regions, merge_traces, normalize_resolution, \
+    open_image
+import models
+import ner_backends
+from ner_backends import NER_BACKEND
+from tesseract_backends import TESSERACT_BACKEND
+from inference_server import MODEL_SERVER_SOCKET, InferenceClient
+from metrics import ALLOW_PROFILING, MEGAPIXEL_BUCKETS, Registry, RequestMetricsMiddleware, StageError, StageTimer, \
+    histogram_samples, profile_call, request_timings
 
 
-app = FastAPI()
+model_client = InferenceClient(MODEL_SERVER_SOCKET) if MODEL_SERVER_SOCKET else None
+pools = WorkerPools(ocr_executor="thread") if model_client else WorkerPools()
+label_cache = LabelCache()
+result_store = ResultStore()
+metrics_registry = Registry()
+stage_timer = StageTimer(metrics_registry)
+request_counter = metrics_registry.counter(
+    "nutriscan_requests_total", "HTTP requests by route and status code.", ("route", "status"))
+request_seconds = metrics_registry.histogram(
+    "nutriscan_request_seconds", "Time to response headers by route.", ("route",))
+image_megapixels = metrics_registry.histogram(
+    "nutriscan_image_megapixels", "Size of decoded uploads.", buckets=MEGAPIXEL_BUCKETS)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if model_client is None and pools.ocr_executor == "process":
+        # Fork the OCR processes before this one loads the NER model, so they do not
+        # inherit torch state; each loads its own EasyOCR (init_ocr_process).
+        await pools.run_ocr(int)
+    if WARMUP_MODELS and model_client is None:
+        ner_model.start()
+        if pools.ocr_executor == "thread":
+            easyocr_model.start()
+    if knowledge_watcher:
+        knowledge_watcher.start()
+    yield
+    if knowledge_watcher:
+        knowledge_watcher.stop()
+    ner_batcher.close()
+    pools.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -19,29 +78,163 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-last_results = {}
 
-easyocr_reader = easyocr.Reader(['en'])
+app.add_middleware(RequestMetricsMiddleware, counter=request_counter, seconds=request_seconds)
+
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "1") != "0"
+MODEL_NAME = "sgarbi/bert-fda-nutrition-ner"
+
+
+def load_easyocr():
+    import easyocr
+    return easyocr.Reader(['en'])
+
+
+def load_ner_pipeline():
+    return ner_backends.load_ner_pipeline(MODEL_NAME, NER_BACKEND)
+
+
+easyocr_model = models.register("easyocr", load_easyocr)
+ner_model = models.register("ner", load_ner_pipeline)
+
+
+def init_ocr_process(loaded):
+    # With OCR in a process pool, this process never runs EasyOCR; each OCR
+    # process starts loading its own as soon as it is forked, and counts itself
+    # in ``loaded`` once the reader is ready.
+    if WARMUP_MODELS:
+        threading.Thread(target=count_loaded_easyocr, args=(loaded,), name="load-easyocr", daemon=True).start()
+
+
+def count_loaded_easyocr(loaded):
+    if easyocr_model.get(wait=True) is not None:
+        with loaded.get_lock():
+            loaded.value += 1
+
+
+ocr_processes_loaded = None
+if model_client is None and pools.ocr_executor == "process":
+    ocr_processes_loaded = multiprocessing.Value("i", 0)
+    pools.ocr_initializer, pools.ocr_initargs = init_ocr_process, (ocr_processes_loaded,)
+
+
+def model_statuses():
+    statuses = models.statuses()
+    if ocr_processes_loaded is not None:
+        loaded = ocr_processes_loaded.value
+        statuses["easyocr"] = {
+            "state": "ready" if loaded >= pools.ocr_workers else "loading" if WARMUP_MODELS else "pending",
+            "processes_loaded": loaded,
+            "processes": pools.ocr_workers,
+        }
+    return statuses
 
 
 def preprocess_image(image: Image.Image) -> Image.Image:
-    image = image.convert("L")
-    image = image.filter(ImageFilter.SHARPEN)
-    enhancer = ImageEnhance.Contrast(image)
-    return enhancer.enhance(2)
+    image = image.convert("L").filter(ImageFilter.SHARPEN)
+    # Same result as ImageEnhance.Contrast(image).enhance(2), as one lookup table
+    # instead of a full-size mean image plus a blend.
+    mean = int(sum(i * n for i, n in enumerate(image.histogram())) / (image.width * image.height) + 0.5)
+    return image.point([min(255, max(0, 2 * v - mean)) for v in range(256)])
+
+
+ocr_router = OcrRouter()
+ocr_stats = OcrStats()
+
+
+region_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ocr-region")
+
+
+preprocessor = None if PREPROCESS_STEPS == "pillow" else Preprocessor(PREPROCESS_STEPS)
+
+
+def ocr_region(image: Image.Image):
+    if preprocessor is None:
+        return ocr_router.route(image, preprocess_image(image), easyocr_model.get)
+    # One preprocessed array for both engines: Tesseract reads it through a
+    # zero-copy PIL view, EasyOCR takes the array itself.
+    pixels = preprocessor(image)
+    return ocr_router.route(pixels, Image.fromarray(pixels), easyocr_model.get)
+
+
+def extract_text_traced(image: Image.Image):
+    """OCR text and trace. When only the label panels were read, the trace's
+    ``overview_text`` holds the whole-pack words from the region search."""
+    started = time.perf_counter()
+    image = normalize_resolution(image)
+    regions, overview = find_label_regions(image) if OCR_ROI else ([], "")
+    timings = {"roi": round((time.perf_counter() - started) * 1000, 2)}
+    if regions:
+        crops = [image.crop(box) for box in regions]
+        if len(crops) == 1:
+            results = [ocr_region(crops[0])]
+        else:
+            results = list(region_pool.map(ocr_region, crops))
+        text = "\n".join(t for t, _ in results if t)
+        if text:
+            trace = merge_traces([trace for _, trace in results], timings)
+            trace["overview_text"] = overview
+            return text, trace
+    text, trace = ocr_region(image)
+    return text, merge_traces([trace], timings)
 
 
 def extract_text(image: Image.Image) -> str:
-    preprocessed = preprocess_image(image)
-    text = pytesseract.image_to_string(preprocessed)
-    if not text.strip():
-        results = easyocr_reader.readtext(image)
-        text = " ".join([res[1] for res in results])
-    return text.strip()
+    return extract_text_traced(image)[0]
+
+
+def decode_image(contents: bytes) -> Image.Image:
+    try:
+        return open_image(contents)
+    except ImageTooLarge as e:
+        raise StageError("decode", e, status_code=413) from e
+    except Exception as e:
+        raise StageError("decode", e, status_code=400) from e
+
+
+def run_ocr_job(contents: bytes):
+    started = time.perf_counter()
+    image = decode_image(contents)
+    decode_ms = round((time.perf_counter() - started) * 1000, 2)
+    width, height = image.info.get("original_size", image.size)
+    megapixels = width * height / 1e6
+    text, trace = model_client.ocr(image) if model_client else extract_text_traced(image)
+    trace["timings_ms"]["decode"] = decode_ms
+    trace["megapixels"] = round(megapixels, 3)
+    return text, trace
+
+
+async def ocr_label(contents: bytes):
+    """The OCR fields of a label cache entry: text, overview and ocr_degraded."""
+    with stage_timer("ocr"):
+        text, trace = await pools.run_ocr(run_ocr_job, contents)
+    overview = trace.pop("overview_text", "")
+    record_ocr_trace(trace)
+    return {"text": text, "overview": overview, "ocr_degraded": trace.get("degraded", False)}
+
+
+def needs_ocr(label):
+    """No cached label, or one read while the EasyOCR fallback was loading or over
+    budget; like missing entities, such a label is retried rather than final."""
+    return label is None or label.get("ocr_degraded", False)
+
+
+def with_entities(ocr, entities):
+    """A label cache entry from a label's OCR fields; facts are added by label_facts()."""
+    return {"text": ocr["text"], "overview": ocr.get("overview", ""), "ocr_degraded": ocr.get("ocr_degraded", False),
+            "entities": entities}
+
+
+def record_ocr_trace(trace):
+    ocr_stats.record(trace)
+    for engine, ms in trace["timings_ms"].items():
+        stage_timer.record(f"ocr_{engine}", ms / 1000)
+    if "megapixels" in trace:
+        image_megapixels.observe(trace["megapixels"])
 
 
 def clean_and_deduplicate(ocr_text: str):
-    items = re.split(r"[\,\n;:\.]", ocr_text)
+    items = DELIMITERS.split(ocr_text)
     cleaned, seen = [], set()
     for item in items:
         word = item.strip().lower()
@@ -52,14 +245,44 @@ def clean_and_deduplicate(ocr_text: str):
     return cleaned
 
 
-MODEL_NAME = "sgarbi/bert-fda-nutrition-ner"
-try:
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    model = AutoModelForTokenClassification.from_pretrained(MODEL_NAME)
-    ner_pipeline = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
-except Exception as e:
-    ner_pipeline = None
-    print("Warning: NER model could not be loaded:", e)
+def entities_to_dicts(entities):
+    return [
+        {
+            "entity_group": ent.get("entity_group", "OTHER"),
+            "word": ent.get("word", ""),
+            "score": float(ent.get("score", 0.0)),
+            "start": ent.get("start"),
+            "end": ent.get("end"),
+        }
+        for ent in entities
+    ]
+
+
+ner_chunker = NerChunker()
+
+
+def run_ner_batch(texts):
+    if model_client:
+        return model_client.ner(texts)
+    ner_pipeline = ner_model.get()
+    if not ner_pipeline:
+        return [None] * len(texts)
+    return [entities_to_dicts(ents) for ents in ner_chunker(ner_pipeline, list(texts))]
+
+
+ner_batcher = MicroBatcher(run_ner_batch, executor=pools.ner_pool(), workers=pools.ner_workers)
+
+
+async def extract_entities(text):
+    started = time.perf_counter()
+    try:
+        return await asyncio.wrap_future(ner_batcher.submit(text))
+    except Exception as e:
+        stage_timer.errors.inc(stage="ner")
+        print("NER error:", e)
+        return None
+    finally:
+        stage_timer.record("ner", time.perf_counter() - started)
 
 
 def compute_bmi(weight, height):
@@ -185,60 +408,26 @@ INGREDIENT_KNOWLEDGE = {
 }
 
 
-def generate_consumption_advice_enhanced(ingredient: str):
+ADVICE_FALLBACK_KEYWORDS = {
+    "risky": ["sugar", "salt", "oil", "butter", "cream", "fried", "syrup"],
+    "moderate": ["milk", "cheese", "bread", "rice", "pasta", "nuts"],
+    "healthy": ["apple", "banana", "carrot", "spinach", "oats", "lentil"],
+}
 
-    for known_ingredient, info in INGREDIENT_KNOWLEDGE.items():
-        if known_ingredient in ingredient.lower():
-            return {
-                "level": info["type"],
-                "effects": info["effects"],
-                "recommendation": info["recommendation"],
-                "frequency": "Occasional (≤1 per week)" if info["type"] == "risky" else 
-                            "1–3 servings/week" if info["type"] == "moderate" else 
-                            "Daily",
-                "amount": "Max 1 serving when consumed" if info["type"] == "risky" else 
-                         "1 serving" if info["type"] == "moderate" else 
-                         "1 serving (e.g., 1 cup/1 piece)"
-            }
-    
-
-    risky = ["sugar", "salt", "oil", "butter", "cream", "fried", "syrup"]
-    moderate = ["milk", "cheese", "bread", "rice", "pasta", "nuts"]
-    healthy = ["apple", "banana", "carrot", "spinach", "oats", "lentil"]
-
-    key = ingredient.lower()
-    if any(r in key for r in risky):
-        return {
-            "level": "risky", 
-            "frequency": "Occasional (≤1 per week)", 
-            "amount": "Max 1 serving when consumed",
-            "effects": ["Potential health risks with overconsumption"],
-            "recommendation": "Limit consumption and check for healthier alternatives"
-        }
-    elif any(m in key for m in moderate):
-        return {
-            "level": "moderate", 
-            "frequency": "1–3 servings/week", 
-            "amount": "1 serving",
-            "effects": ["Provides nutrients but should be consumed in moderation"],
-            "recommendation": "Consume as part of a balanced diet"
-        }
-    elif any(h in key for h in healthy):
-        return {
-            "level": "healthy", 
-            "frequency": "Daily", 
-            "amount": "1 serving (e.g., 1 cup/1 piece)",
-            "effects": ["Provides essential nutrients and health benefits"],
-            "recommendation": "Regular consumption recommended"
-        }
-    else:
-        return {
-            "level": "unknown", 
-            "frequency": "Unknown", 
-            "amount": "Unknown",
-            "effects": ["Insufficient data for specific recommendations"],
-            "recommendation": "Consume mindfully and check for allergens"
-        }
+
+INGREDIENT_KNOWLEDGE_PATH = os.getenv("INGREDIENT_KNOWLEDGE_PATH", "")
+
+
+def generate_consumption_advice_enhanced(ingredient: str):
+    payload = knowledge_base.ingredient_index.advise([ingredient])[0]
+    advice = payload["advice"]
+    return {
+        "level": payload["level"],
+        "frequency": advice["frequency"],
+        "amount": advice["amount"],
+        "effects": list(payload["effects"]),
+        "recommendation": advice["recommendation"]
+    }
 
 
 PRODUCT_KEYWORDS = {
@@ -266,23 +455,132 @@ known_products = {
 }
 
 
-def recognize_product(ocr_text: str):
-    text = ocr_text.lower()
-    for key, name in known_products.items():
-        if key in text:
-            return name
+RISK_KEYWORDS = ["sugar", "salt", "syrup", "fat", "hydrogenated", "trans", "butter", "cream", "oil", "sodium", "additive", "preservative"]
+BENEFIT_KEYWORDS = ["vitamin", "protein", "calcium", "iron", "fiber", "dietary fiber", "antioxidant", "mineral", "whole grain"]
+NET_WEIGHT_KEYWORDS = ["net wt", "net weight"]
+
+DIET_RESTRICTIONS = {
+    "vegan": (["milk", "egg", "cheese", "butter", "honey", "gelatin", "whey"], "Not vegan-friendly"),
+    "vegetarian": (["meat", "fish", "chicken", "gelatin", "rennet", "lard"], "Not vegetarian-friendly"),
+    "keto": (["sugar", "rice", "bread", "pasta", "syrup", "honey", "flour"], "High in carbs — not keto-friendly"),
+    "diabetic": (["sugar", "syrup", "honey", "glucose", "fructose", "dextrose"], "High sugar — not suitable for diabetic diet"),
+    "gluten-free": (["wheat", "barley", "rye", "gluten", "malt"], "Contains gluten — not gluten-free"),
+}
+
+PRODUCT_CATALOG_PATH = os.getenv("PRODUCT_CATALOG_PATH", "")
+
+
+def builtin_tables():
+    """The tables above as plain data, with the INGREDIENT_KNOWLEDGE_PATH and
+    PRODUCT_CATALOG_PATH overlays applied; the input of ``kbfile.py build``."""
+    ingredient_knowledge = dict(INGREDIENT_KNOWLEDGE)
+    if INGREDIENT_KNOWLEDGE_PATH:
+        ingredient_knowledge.update(load_knowledge_file(INGREDIENT_KNOWLEDGE_PATH))
+    products = list(known_products.items())
+    if PRODUCT_CATALOG_PATH:
+        products.extend(load_catalog_file(PRODUCT_CATALOG_PATH))
+    return {
+        "ingredient_knowledge": ingredient_knowledge,
+        "advice_fallback": ADVICE_FALLBACK_KEYWORDS,
+        "product_keywords": PRODUCT_KEYWORDS,
+        "products": products,
+        "risk_keywords": RISK_KEYWORDS,
+        "benefit_keywords": BENEFIT_KEYWORDS,
+        "net_weight_keywords": NET_WEIGHT_KEYWORDS,
+        "diet_restrictions": DIET_RESTRICTIONS,
+    }
+
+
+class KnowledgeBase:
+    """One version of the knowledge tables, compiled for lookups.
+
+    Instances are never modified. A hot reload builds a new one off the
+    request path and replaces ``knowledge_base`` in one assignment. Code
+    that makes several lookups for one label reads ``knowledge_base`` once
+    and passes the snapshot along, so a reload in the middle of a request
+    cannot mix two versions.
+    """
+
+    def __init__(self, tables, version=0, source="built-in", signature=None):
+        # ``tables`` as KnowledgeFile.tables() or kbfile.compile_tables() returns them.
+        self.version = version
+        self.source = source
+        self.signature = signature
+        self.loaded_at = time.time()
+        self.diet_restrictions = {diet: (list(words), message)
+                                  for diet, (words, message) in tables["diet_restrictions"].items()}
+        self.ingredient_index = IngredientIndex.from_table(tables["ingredients"])
+        self.product_catalog = ProductCatalog(tables["products"])
+        self.product_type_order = {p: i for i, p in enumerate(tables["product_keywords"])}
+        self.product_keyword_index = {}
+        for product_type, kws in tables["product_keywords"].items():
+            for kw in kws:
+                self.product_keyword_index.setdefault(kw, []).append(product_type)
+        self.keywords = build_matcher({
+            "risk": tables["risk_keywords"],
+            "benefit": tables["benefit_keywords"],
+            "product_keyword": self.product_keyword_index,
+            "net_weight": tables["net_weight_keywords"],
+        })
+
+    def stats(self):
+        return {"version": self.version, "source": self.source, "loaded_at": round(self.loaded_at, 3),
+                "ingredients": len(self.ingredient_index), "product_catalog": self.product_catalog.stats()}
+
+
+def load_knowledge_base():
+    if not KNOWLEDGE_FILE:
+        return KnowledgeBase(compile_tables(builtin_tables()))
+    kb = KnowledgeFile(KNOWLEDGE_FILE)
+    return KnowledgeBase(kb.tables(), kb.version, KNOWLEDGE_FILE, kb.signature)
+
+
+knowledge_base = load_knowledge_base()
+
+
+def swap_knowledge_base(kb: KnowledgeFile):
+    global knowledge_base
+    if kb.version == knowledge_base.version:
+        return
+    knowledge_base = KnowledgeBase(kb.tables(), kb.version, kb.path, kb.signature)
+    print(f"Knowledge base version {kb.version} loaded from {kb.path}")
+
+
+knowledge_watcher = KnowledgeWatcher(KNOWLEDGE_FILE, swap_knowledge_base, signature=knowledge_base.signature) \
+    if KNOWLEDGE_FILE else None
+
+
+def keyword_hits(text: str, kb=None):
+    hits = {}
+    for (category, keyword), _, _ in (kb or knowledge_base).keywords.iter_matches(text):
+        hits.setdefault(category, set()).add(keyword)
+    return hits
+
+
+def product_text(text, overview=""):
+    """The text products are recognized in: the OCR text plus, when OCR read only
+    the label panels, the whole-pack overview where brand names usually are."""
+    return f"{overview}\n{text}" if overview else text
+
+
+def recognize_product(ocr_text: str, kb=None):
+    kb = kb or knowledge_base
+    product = kb.product_catalog.match(ocr_text)
+    if product:
+        return product
+
+    hits = keyword_hits(ocr_text.lower(), kb)
 
     scores = {}
-    for p, kws in PRODUCT_KEYWORDS.items():
-        for k in kws:
-            if k in text:
-                scores[p] = scores.get(p, 0) + 1
+    for k in hits.get("product_keyword", ()):
+        for p in kb.product_keyword_index[k]:
+            scores[p] = scores.get(p, 0) + 1
     if not scores:
-        if "net wt" in text or "net weight" in text:
+        if "net_weight" in hits:
             return "Packaged product"
         return "Unknown"
 
-    return max(scores.items(), key=lambda x: x[1])[0]
+    return max(scores.items(), key=lambda x: (x[1], -kb.product_type_order[x[0]]))[0]
 
 
 def clean_entity_token(token: str):
@@ -291,65 +589,93 @@ def clean_entity_token(token: str):
     return token
 
 
-def analyze_text(text, user_profile):
-    product = recognize_product(text)
-    raw_ingredients = clean_and_deduplicate(text)
+def extract_label_facts(text, entities=None, overview=""):
+    """Everything about a label that does not depend on who is asking.
 
-    ocr_preview = {
-        "raw_text": text,
-        "cleaned_ingredients": raw_ingredients
-    }
+    Product, ingredients, NER tokens, risk/benefit tags, consumption advice,
+    and the diets the label conflicts with. The result is a plain dict, so it
+    can live in the label cache; score_label() turns it into an analysis for
+    one profile.
+    """
+    kb = knowledge_base
+    product = recognize_product(product_text(text, overview), kb)
+    raw_ingredients = clean_and_deduplicate(text)
 
-    entities, grouped, flat_tokens = [], {}, []
+    grouped, flat_tokens = {}, []
+    ner_pipeline = ner_model.get() if entities is None else None
     if ner_pipeline:
         try:
-            entities = ner_pipeline(text)
-            for ent in entities:
-                label = ent.get("entity_group", "OTHER")
-                word = clean_entity_token(ent.get("word", ""))
-                if word:
-                    grouped.setdefault(label, []).append(word.lower())
-                    flat_tokens.append(word.lower())
+            entities = ner_chunker(ner_pipeline, [text])[0]
         except Exception as e:
             print("NER error:", e)
+    for ent in entities or []:
+        label = ent.get("entity_group", "OTHER")
+        word = clean_entity_token(ent.get("word", ""))
+        if word:
+            grouped.setdefault(label, []).append(word.lower())
+            flat_tokens.append(word.lower())
 
     if not grouped:
         grouped = {"INGREDIENTS": raw_ingredients}
         flat_tokens = raw_ingredients
 
     risks, benefits = [], []
-    risk_keywords = ["sugar", "salt", "syrup", "fat", "hydrogenated", "trans", "butter", "cream", "oil", "sodium", "additive", "preservative"]
-    benefit_keywords = ["vitamin", "protein", "calcium", "iron", "fiber", "dietary fiber", "antioxidant", "mineral", "whole grain"]
-
+    has_sugar = False
     for w in flat_tokens:
-        if any(rk in w for rk in risk_keywords) and w not in risks:
+        hits = keyword_hits(w, kb)
+        risk_hits = hits.get("risk", ())
+        if risk_hits and w not in risks:
             risks.append(w)
-        if any(bk in w for bk in benefit_keywords) and w not in benefits:
+        if "benefit" in hits and w not in benefits:
             benefits.append(w)
-    if any("sugar" in w for w in flat_tokens) and "high sugar content" not in risks:
+        has_sugar = has_sugar or "sugar" in risk_hits
+    if has_sugar and "high sugar content" not in risks:
         risks.append("high sugar content")
 
+    token_set = set(flat_tokens)
+    diet_conflicts = [diet for diet, (words, _) in kb.diet_restrictions.items() if not token_set.isdisjoint(words)]
+
+    consumption_advice = []
+    for ing, payload in zip(raw_ingredients, kb.ingredient_index.advise(raw_ingredients)):
+        if payload["level"] == "unknown":
+            continue
+        consumption_advice.append({
+            "ingredient": ing.title(),
+            "level": payload["level"],
+            "effects": payload["effects"],
+            "advice": payload["advice"]
+        })
+
+    return {
+        "knowledge_version": kb.version,
+        "text": text,
+        "product": product,
+        "ingredients": raw_ingredients,
+        # Tokens joined by NUL: one substring search finds an allergen in any token.
+        "tokens": "\0".join(flat_tokens),
+        "risks": risks,
+        "benefits": benefits,
+        "diet_conflicts": diet_conflicts,
+        "consumption_advice": consumption_advice,
+    }
+
+
+def score_label(facts, user_profile):
+    """The analysis of a label (its extract_label_facts() dict) for one profile."""
+    risks = facts["risks"]
     bmi, bmi_cat = compute_bmi(user_profile.get("weight"), user_profile.get("height"))
 
-    allergy_flags = [f"Contains allergen: {a}" for a in user_profile.get("allergies", []) if any(a.lower() in w for w in flat_tokens)]
+    allergy_flags = [f"Contains allergen: {a}" for a in user_profile.get("allergies", []) if a.lower() in facts["tokens"]]
 
     diet_flags, diet = [], (user_profile.get("diet") or "No restrictions").lower()
-    if diet == "vegan" and any(w in flat_tokens for w in ["milk", "egg", "cheese", "butter", "honey", "gelatin", "whey"]):
-        diet_flags.append("Not vegan-friendly")
-    if diet == "vegetarian" and any(w in flat_tokens for w in ["meat", "fish", "chicken", "gelatin", "rennet", "lard"]):
-        diet_flags.append("Not vegetarian-friendly")
-    if diet == "keto" and any(w in flat_tokens for w in ["sugar", "rice", "bread", "pasta", "syrup", "honey", "flour"]):
-        diet_flags.append("High in carbs — not keto-friendly")
-    if diet == "diabetic" and any(w in flat_tokens for w in ["sugar", "syrup", "honey", "glucose", "fructose", "dextrose"]):
-        diet_flags.append("High sugar — not suitable for diabetic diet")
-    if diet == "gluten-free" and any(w in flat_tokens for w in ["wheat", "barley", "rye", "gluten", "malt"]):
-        diet_flags.append("Contains gluten — not gluten-free")
+    if diet in facts["diet_conflicts"]:
+        diet_flags.append(knowledge_base.diet_restrictions[diet][1])
 
     base = 100
     base -= len(set(risks)) * 8
     if allergy_flags:
         base -= 20
-    base -= len(set(diet_flags)) * 5
+    base -= len(diet_flags) * 5
     health_score = max(0, min(100, base))
 
     if health_score >= 80:
@@ -361,35 +687,11 @@ def analyze_text(text, user_profile):
     else:
         verdict, verdict_expl = "Unhealthy", "High-risk product — avoid frequent consumption."
 
-    consumption_advice = []
-    for ing in raw_ingredients:
-        adv = generate_consumption_advice_enhanced(ing)
-        if adv["level"] == "unknown":
-            continue
-            
-        summary = (
-            f"Consider limiting to {adv['frequency']}. {adv['amount']}. {adv['recommendation']}" if adv["level"] == "risky"
-            else f"Consume in moderation: {adv['frequency']}, typical amount: {adv['amount']}. {adv['recommendation']}" if adv["level"] == "moderate"
-            else f"Healthy choice: {adv['frequency']}. Typical serving: {adv['amount']}. {adv['recommendation']}" if adv["level"] == "healthy"
-            else "No clear guidance — consume mindfully."
-        )
-        consumption_advice.append({
-            "ingredient": ing.title(),
-            "level": adv["level"],
-            "effects": adv.get("effects", []),
-            "advice": {
-                "frequency": adv.get("frequency"), 
-                "amount": adv.get("amount"), 
-                "summary": summary,
-                "recommendation": adv.get("recommendation", "")
-            }
-        })
-
     return {
-        "detected_product": product,
-        "ingredients": raw_ingredients,
+        "detected_product": facts["product"],
+        "ingredients": facts["ingredients"],
         "risk_tags": risks + allergy_flags + diet_flags,
-        "benefit_tags": benefits,
+        "benefit_tags": facts["benefits"],
         "analysis": {
             "health_score": {"score": health_score, "out_of": 100, "explanation": "Score computed from detected risks, allergies and diet compatibility."},
             "verdict": verdict,
@@ -401,13 +703,167 @@ def analyze_text(text, user_profile):
             "bmi_category": bmi_cat,
             "personalized_limits": {"age": user_profile.get("age"), "diet": user_profile.get("diet"), "allergies": user_profile.get("allergies")}
         },
-        "consumption_advice": consumption_advice,
-        "ocr_preview": ocr_preview 
+        "consumption_advice": facts["consumption_advice"],
+        "ocr_preview": {
+            "raw_text": facts["text"],
+            "cleaned_ingredients": facts["ingredients"]
+        }
     }
 
 
+def analyze_text(text, user_profile, entities=None, overview=""):
+    return score_label(extract_label_facts(text, entities, overview), user_profile)
+
+
+def build_user_profile(gender, age, weight, height, diet, allergies):
+    return {
+        "gender": gender,
+        "age": age,
+        "weight": weight,
+        "height": height,
+        "diet": diet,
+        "allergies": [a.strip() for a in allergies.split(",") if a.strip()]
+    }
+
+
+MAX_UPLOAD_BYTES = env_int("MAX_UPLOAD_BYTES", 25 * 1024 * 1024)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def upload_too_large():
+    return HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Read an upload in chunks, refusing it as soon as it passes MAX_UPLOAD_BYTES."""
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise upload_too_large()
+    chunks, total = [], 0
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > MAX_UPLOAD_BYTES:
+            raise upload_too_large()
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def label_facts(key, label, changed=False):
+    """The label's extract_label_facts(), computed once per knowledge version and kept with it in the label cache.
+
+    The label is written to the cache once, with its facts, when it is new or
+    ``changed`` or its facts had to be recomputed.
+    """
+    facts = label.get("facts")
+    if facts is None or facts.get("knowledge_version") != knowledge_base.version:
+        facts = extract_label_facts(label["text"], label["entities"] or [], label.get("overview", ""))
+        label, changed = {**label, "facts": facts}, True
+    if changed:
+        await label_cache.aput(key, label)
+    return facts
+
+
+async def analyze_label(contents: bytes, user_profile):
+    key = content_hash(contents)
+    label = await label_cache.aget(key)
+    changed = needs_ocr(label) or label["entities"] is None
+    if changed:
+        ocr = await ocr_label(contents) if needs_ocr(label) else label
+        label = with_entities(ocr, await extract_entities(ocr["text"]) if ocr["text"] else [])
+    if not label["text"]:
+        if changed:
+            await label_cache.aput(key, label)
+        raise HTTPException(status_code=400, detail="No text found in image")
+    with stage_timer("analyze"):
+        analysis = score_label(await label_facts(key, label, changed), user_profile)
+    analysis["label_id"] = key
+    return analysis
+
+
+def analyze_label_uncached(contents: bytes, user_profile):
+    """The whole pipeline in the calling thread, bypassing the label cache and
+    worker pools, so a profiler sees every stage."""
+    text, trace = run_ocr_job(contents)
+    overview = trace.pop("overview_text", "")
+    record_ocr_trace(trace)
+    if not text:
+        raise HTTPException(status_code=400, detail="No text found in image")
+    entities = run_ner_batch([text])[0]
+    analysis = analyze_text(text, user_profile, entities or [], overview)
+    analysis["label_id"] = content_hash(contents)
+    return analysis
+
+
+PROFILE_MODES = ("cprofile", "pyinstrument")
+
+
 @app.post("/analyze")
 async def analyze_image(
+    file: UploadFile = File(...),
+    gender: str = Form("Unspecified"),
+    age: int = Form(30),
+    weight: float = Form(65.0),
+    height: float = Form(165.0),
+    diet: str = Form("No restrictions"),
+    allergies: str = Form(""),
+    x_timings: str = Header(""),
+    x_profile: str = Header("")
+):
+    """``X-Timings: 1`` adds a per-stage ``timings_ms`` breakdown to the response.
+    ``X-Profile: cprofile`` (or ``pyinstrument``) adds a profiler report; it is
+    only honoured when the server runs with ALLOW_PROFILING=1."""
+    timings = {} if x_timings.strip().lower() in ("1", "true", "yes") else None
+    profile_mode = x_profile.strip().lower()
+    if profile_mode and not ALLOW_PROFILING:
+        raise HTTPException(status_code=403, detail="Profiling is disabled (set ALLOW_PROFILING=1)")
+    if profile_mode and profile_mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"X-Profile must be one of {', '.join(PROFILE_MODES)}")
+    request_timings.set(timings)
+    async with pools.admit():
+        try:
+            contents = await read_upload(file)
+            user_profile = build_user_profile(gender, age, weight, height, diet, allergies)
+            report = None
+            if profile_mode:
+                analysis, report = await asyncio.to_thread(
+                    profile_call, profile_mode, analyze_label_uncached, contents, user_profile)
+            else:
+                analysis = await analyze_label(contents, user_profile)
+            with stage_timer("store"):
+                await result_store.aput(analysis)
+            if timings is not None:
+                analysis["timings_ms"] = timings
+            if report is not None:
+                analysis["profile"] = report
+            with stage_timer("serialize"):
+                return JSONResponse(content=analysis)
+        except HTTPException:
+            raise
+        except StageError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail())
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """A StreamingResponse that releases its admission slot however the response ends,
+    including when the body is never iterated (client gone before the first send)."""
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+@app.post("/analyze/stream")
+async def analyze_image_stream(
     file: UploadFile = File(...),
     gender: str = Form("Unspecified"),
     age: int = Form(30),
@@ -416,32 +872,359 @@ async def analyze_image(
     diet: str = Form("No restrictions"),
     allergies: str = Form("")
 ):
-    global last_results
+    """Same analysis as /analyze, streamed as NDJSON events in pipeline order:
+    ocr, ingredients, product, entities, then result (or a single error event)."""
+    user_profile = build_user_profile(gender, age, weight, height, diet, allergies)
+    release = pools.hold()
     try:
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        text = extract_text(image)
-        if not text:
-            raise HTTPException(status_code=400, detail="No text found in image")
-
-        user_profile = {
-            "gender": gender,
-            "age": age,
-            "weight": weight,
-            "height": height,
-            "diet": diet,
-            "allergies": [a.strip() for a in allergies.split(",") if a.strip()]
-        }
-
-        analysis = analyze_text(text, user_profile)
-        last_results = analysis
-        return JSONResponse(content=analysis)
-    except HTTPException:
+        contents = await read_upload(file)
+    except BaseException:
+        release()
         raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    async def stream():
+        try:
+            key = content_hash(contents)
+            label = await label_cache.aget(key)
+            if needs_ocr(label):
+                ocr, label = await ocr_label(contents), None
+            else:
+                ocr = label
+            text, overview = ocr["text"], ocr.get("overview", "")
+            if not text:
+                if label is None:
+                    await label_cache.aput(key, with_entities(ocr, []))
+                yield json.dumps({"stage": "error", "status": 400, "detail": "No text found in image"}) + "\n"
+                return
+            yield json.dumps({"stage": "ocr", "text": text}) + "\n"
+            yield json.dumps({"stage": "ingredients", "ingredients": clean_and_deduplicate(text)}) + "\n"
+            yield json.dumps({"stage": "product", "detected_product": recognize_product(product_text(text, overview))}) + "\n"
+            changed = label is None or label["entities"] is None
+            if changed:
+                label = with_entities(ocr, await extract_entities(text))
+            yield json.dumps({"stage": "entities", "entities": label["entities"] or []}) + "\n"
+            with stage_timer("analyze"):
+                analysis = score_label(await label_facts(key, label, changed), user_profile)
+            analysis["label_id"] = key
+            await result_store.aput(analysis)
+            yield json.dumps({"stage": "result", "result": analysis}) + "\n"
+        except StageError as e:
+            yield json.dumps({"stage": "error", "status": e.status_code, "failed_stage": e.stage,
+                              "detail": str(e)}) + "\n"
+        except Exception as e:
+            yield json.dumps({"stage": "error", "status": 500, "detail": str(e)}) + "\n"
+        finally:
+            release()
+
+    return AdmittedStreamingResponse(stream(), release, media_type="application/x-ndjson")
+
+
+async def cached_label_facts(label_id):
+    """The cached label's facts for /rescore and /rescore/bulk; NER is re-run if it was unavailable before."""
+    if not is_content_hash(label_id):
+        raise HTTPException(status_code=400, detail="label_id must be the 64-character hex SHA-256 of the image")
+    label = await label_cache.aget(label_id)
+    if label is None:
+        raise HTTPException(status_code=404, detail="Label not cached; analyze the image again")
+    if not label["text"]:
+        raise HTTPException(status_code=400, detail="No text found in image")
+    changed = label["entities"] is None
+    if changed:
+        label = with_entities(label, await extract_entities(label["text"]))
+    return await label_facts(label_id, label, changed)
+
+
+@app.post("/rescore")
+async def rescore_label(
+    label_id: str = Form(...),
+    gender: str = Form("Unspecified"),
+    age: int = Form(30),
+    weight: float = Form(65.0),
+    height: float = Form(165.0),
+    diet: str = Form("No restrictions"),
+    allergies: str = Form("")
+):
+    """Score an already analyzed label for another profile without re-uploading it.
+
+    ``label_id`` is the ``label_id`` of an earlier /analyze result (the
+    image's SHA-256). The label's profile-independent facts come from the
+    label cache, so only score_label() runs; 404 means the label was evicted
+    or never analyzed, and the client should send the image to /analyze again.
+    """
+    facts = await cached_label_facts(label_id)
+    user_profile = build_user_profile(gender, age, weight, height, diet, allergies)
+    try:
+        with stage_timer("rescore"):
+            analysis = score_label(facts, user_profile)
+    except StageError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    analysis["label_id"] = label_id
+    await result_store.aput(analysis)
+    return JSONResponse(content=analysis)
+
+
+def evaluate_profiles(facts, profiles):
+    table = bulk.ProfileTable.from_columns(profiles)
+    columns = bulk.evaluate(facts, table)
+    unsuitable = columns["allergy_hit"] | columns["diet_conflict"]
+    return {
+        "count": len(table),
+        "unsuitable": unsuitable.nonzero()[0].tolist(),
+        "health_score": columns["health_score"].tolist(),
+        "verdict": [bulk.VERDICTS[v] for v in columns["verdict"].tolist()],
+        "allergy_hit": columns["allergy_hit"].tolist(),
+        "diet_conflict": columns["diet_conflict"].tolist(),
+        "bmi": [None if b != b else b for b in columns["bmi"].tolist()],
+        "bmi_category": [bulk.BMI_CATEGORIES[c] for c in columns["bmi_category"].tolist()],
+    }
+
+
+@app.post("/rescore/bulk")
+async def rescore_bulk(label_id: str = Body(...), profiles: dict = Body(...)):
+    """Score one analyzed label for many profiles at once.
+
+    ``profiles`` holds equal-length columns ``weight``, ``height``, ``diet``
+    and ``allergies`` (comma-separated strings or lists). The response has
+    one entry per profile in each column, plus ``unsuitable``: the indexes
+    of profiles the label conflicts with through an allergy or the diet.
+    """
+    facts = await cached_label_facts(label_id)
+    try:
+        with stage_timer("rescore_bulk", passthrough=(KeyError, TypeError, ValueError)):
+            result = await asyncio.to_thread(evaluate_profiles, facts, profiles)
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid profile columns: {e}")
+    except StageError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    return JSONResponse(content={"label_id": label_id, **result})
+
+
+BATCH_CONCURRENCY = env_int("BATCH_CONCURRENCY", pools.ocr_workers * 2)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+
+def iter_upload_images(upload: UploadFile):
+    """Yield (name, bytes) for an uploaded image, or for every image inside a zip/tar upload.
+
+    Images larger than MAX_UPLOAD_BYTES are yielded as (name, None) without being read.
+    """
+    fileobj = upload.file
+    fileobj.seek(0)
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    too_large = info.file_size > MAX_UPLOAD_BYTES
+                    yield info.filename, None if too_large else archive.read(info)
+        return
+    fileobj.seek(0)
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode="r:*")
+    except tarfile.TarError:
+        size = fileobj.seek(0, os.SEEK_END)
+        fileobj.seek(0)
+        yield upload.filename, None if size > MAX_UPLOAD_BYTES else fileobj.read()
+        return
+    with archive:
+        for member in archive:
+            if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                too_large = member.size > MAX_UPLOAD_BYTES
+                yield member.name, None if too_large else archive.extractfile(member).read()
+
+
+async def aiter_upload_images(uploads):
+    for upload in uploads:
+        images = iter_upload_images(upload)
+        while True:
+            item = await asyncio.to_thread(next, images, None)
+            if item is None:
+                break
+            yield item
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(
+    files: list[UploadFile] = File(...),
+    gender: str = Form("Unspecified"),
+    age: int = Form(30),
+    weight: float = Form(65.0),
+    height: float = Form(165.0),
+    diet: str = Form("No restrictions"),
+    allergies: str = Form("")
+):
+    user_profile = build_user_profile(gender, age, weight, height, diet, allergies)
+    release = pools.hold()
+
+    async def stream():
+        # Bounded like the images in flight: a client reading slowly holds up
+        # the analyses instead of letting finished results pile up here.
+        results = asyncio.Queue(maxsize=BATCH_CONCURRENCY)
+        tasks, running = set(), set()
+
+        async def analyze_one(index, name, contents):
+            try:
+                if contents is None:
+                    raise upload_too_large()
+                analysis = await analyze_label(contents, user_profile)
+                await result_store.aput(analysis, batch=True)
+                line = {"index": index, "filename": name, "status": 200, "result": analysis}
+            except HTTPException as e:
+                line = {"index": index, "filename": name, "status": e.status_code, "error": e.detail}
+            except StageError as e:
+                line = {"index": index, "filename": name, "status": e.status_code, "stage": e.stage, "error": str(e)}
+            except Exception as e:
+                line = {"index": index, "filename": name, "status": 500, "error": str(e)}
+            await results.put(line)
+
+        async def produce():
+            count = 0
+            try:
+                async for name, contents in aiter_upload_images(files):
+                    # The batch's own slot covers one image; every further image in flight takes
+                    # another admission slot, so MAX_PENDING bounds images rather than requests.
+                    while running and (len(running) >= BATCH_CONCURRENCY or not pools.try_acquire()):
+                        await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    extra_slot = bool(running)
+                    task = asyncio.create_task(analyze_one(count, name, contents))
+                    tasks.add(task)
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+                    if extra_slot:
+                        task.add_done_callback(lambda _: pools.release())
+                    count += 1
+                error = None
+            except Exception as e:
+                error = str(e)
+            await asyncio.gather(*tasks)
+            await results.put({"done": True, "count": count, "error": error})
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                line = await results.get()
+                yield json.dumps(line) + "\n"
+                if line.get("done"):
+                    break
+        finally:
+            producer.cancel()
+            for task in tasks:
+                task.cancel()
+
+    return AdmittedStreamingResponse(stream(), release, media_type="application/x-ndjson")
+
+
+@app.get("/results/{analysis_id}")
+async def get_results(analysis_id: str):
+    payload = await result_store.aget_json(analysis_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired analysis ID")
+    return Response(content=payload, media_type="application/json")
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readyz(require: str = ""):
+    if model_client:
+        try:
+            statuses = await asyncio.to_thread(model_client.status)
+        except Exception as e:
+            return JSONResponse(content={"ready": False, "error": f"model server unavailable: {e}"}, status_code=503)
+    else:
+        statuses = model_statuses()
+    required = [name.strip() for name in require.split(",") if name.strip()]
+    unknown = [name for name in required if name not in statuses]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown models: {', '.join(unknown)}")
+    ready = all(statuses[name]["state"] == "ready" for name in required)
+    body = {
+        "ready": ready,
+        "degraded": any(st["state"] != "ready" for st in statuses.values()),
+        "models": statuses,
+    }
+    return JSONResponse(content=body, status_code=200 if ready else 503)
+
+
+@app.get("/stats")
+async def get_stats():
+    return JSONResponse(content={
+        "pending_requests": pools.pending,
+        "max_pending": pools.max_pending,
+        "ocr_pool_restarts": pools.ocr_restarts,
+        "ner_backend": NER_BACKEND,
+        "tesseract_backend": TESSERACT_BACKEND,
+        "ner_batching": ner_batcher.stats(),
+        "ner_chunking": ner_chunker.stats(),
+        "label_cache": label_cache.stats(),
+        "result_store": result_store.stats(),
+        "ocr": ocr_stats.stats(),
+        "knowledge": {**knowledge_base.stats(), "watcher": knowledge_watcher.stats() if knowledge_watcher else None},
+    })
+
+
+@metrics_registry.collector
+def collect_service_metrics():
+    batching = ner_batcher.stats()
+    chunking = ner_chunker.stats()
+    cache = label_cache.stats()
+    store = result_store.stats()
+    ocr = ocr_stats.stats()
+    fallbacks = ocr["results_by_engine"].get("easyocr", {}).get("count", 0)
+    batch_buckets = []
+    for key, count in batching["batch_size_histogram"].items():
+        batch_buckets.append((float("inf") if key == "+Inf" else float(key[2:]), count))
+    return [
+        ("nutriscan_pending_requests", "gauge", "Requests in flight (queue depth).",
+         [("nutriscan_pending_requests", {}, pools.pending)]),
+        ("nutriscan_max_pending", "gauge", "Requests allowed in flight before 503.",
+         [("nutriscan_max_pending", {}, pools.max_pending)]),
+        ("nutriscan_ocr_pool_restarts_total", "counter", "OCR process pools replaced after a worker process died.",
+         [("nutriscan_ocr_pool_restarts_total", {}, pools.ocr_restarts)]),
+        ("nutriscan_label_cache_lookups_total", "counter", "Label cache lookups by result.",
+         [("nutriscan_label_cache_lookups_total", {"result": result}, cache[key])
+          for result, key in (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))]),
+        ("nutriscan_label_cache_entries", "gauge", "Labels cached in memory.",
+         [("nutriscan_label_cache_entries", {}, cache["entries"])]),
+        ("nutriscan_result_store_bytes", "gauge", "Serialized results held in memory.",
+         [("nutriscan_result_store_bytes", {}, store["bytes"])]),
+        ("nutriscan_result_store_batch_bytes", "gauge", "Serialized /analyze/batch results held in memory.",
+         [("nutriscan_result_store_batch_bytes", {}, store["batch"]["bytes"])]),
+        ("nutriscan_ner_batch_size", "histogram", "Texts per NER model call.",
+         histogram_samples("nutriscan_ner_batch_size", {}, batch_buckets, batching["items"])),
+        ("nutriscan_ner_windows_total", "counter", "NER model inputs, after long texts are split into windows.",
+         [("nutriscan_ner_windows_total", {}, chunking["windows"])]),
+        ("nutriscan_ner_chunked_texts_total", "counter", "Texts too long for one NER window.",
+         [("nutriscan_ner_chunked_texts_total", {}, chunking["chunked_texts"])]),
+        ("nutriscan_ner_queue_depth", "gauge", "Texts waiting for an NER batch.",
+         [("nutriscan_ner_queue_depth", {}, batching["queued"])]),
+        ("nutriscan_ner_batch_errors_total", "counter", "Failed NER batches.",
+         [("nutriscan_ner_batch_errors_total", {}, batching["errors"])]),
+        ("nutriscan_ner_retried_items_total", "counter", "Texts rerun on their own after their NER batch failed.",
+         [("nutriscan_ner_retried_items_total", {}, batching["retried_items"])]),
+        ("nutriscan_ocr_images_total", "counter", "Images OCR'd.",
+         [("nutriscan_ocr_images_total", {}, ocr["images"])]),
+        ("nutriscan_ocr_engine_calls_total", "counter", "OCR engine invocations.",
+         [("nutriscan_ocr_engine_calls_total", {"engine": engine}, s["calls"])
+          for engine, s in ocr["engines"].items()]),
+        ("nutriscan_ocr_results_total", "counter", "Images by the engine whose text was used.",
+         [("nutriscan_ocr_results_total", {"engine": engine}, s["count"])
+          for engine, s in ocr["results_by_engine"].items()]),
+        ("nutriscan_ocr_decisions_total", "counter", "OCR routing decisions.",
+         [("nutriscan_ocr_decisions_total", {"decision": decision}, count)
+          for decision, count in ocr["decisions"].items()]),
+        ("nutriscan_ocr_fallback_ratio", "gauge", "Share of images whose text came from EasyOCR.",
+         [("nutriscan_ocr_fallback_ratio", {}, round(fallbacks / ocr["images"], 4) if ocr["images"] else 0.0)]),
+        ("nutriscan_knowledge_version", "gauge", "Version of the knowledge base in use (0 = built-in tables).",
+         [("nutriscan_knowledge_version", {}, knowledge_base.version)]),
+        ("nutriscan_knowledge_reload_errors_total", "counter", "Knowledge files that failed to load.",
+         [("nutriscan_knowledge_reload_errors_total", {}, knowledge_watcher.errors if knowledge_watcher else 0)]),
+    ]
 
 
-@app.get("/results")
-async def get_results():
-    return JSONResponse(content=last_results or {"message": "No results yet"})
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from workers import env_int
+
+
+NER_BATCH_SIZE = env_int("NER_BATCH_SIZE", 16)
+NER_BATCH_WAIT_MS = env_int("NER_BATCH_WAIT_MS", 10)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class MicroBatcher:
+    """Collects items submitted from many threads/requests into batches.
+
+    A batch is dispatched when ``max_batch_size`` items are waiting or
+    ``max_wait_ms`` has passed since the first item arrived. While all
+    ``workers`` slots are busy, new items keep accumulating, so batches grow
+    with load. ``run_batch`` receives a list of items and must return one
+    result per item, in order. When a batch of several items fails, each
+    item is run again on its own, so only the items that fail by themselves
+    get the exception.
+    """
+
+    def __init__(self, run_batch, max_batch_size=NER_BATCH_SIZE, max_wait_ms=NER_BATCH_WAIT_MS,
+                 executor=None, workers=1):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self.executor = executor
+        self._slots = threading.Semaphore(workers if executor is not None else 1)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._retried = 0
+        self._max_batch = 0
+        self._size_buckets = {f"<={b}": 0 for b in BATCH_SIZE_BUCKETS}
+        self._size_buckets["+Inf"] = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    def submit(self, item) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._collect, name="micro-batcher", daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            self._slots.acquire()
+            batch, stop = [first], False
+            deadline = first[2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    timeout = deadline - time.perf_counter()
+                    item = self._queue.get_nowait() if timeout <= 0 else self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            if self.executor is not None:
+                try:
+                    self.executor.submit(self._run, batch)
+                except RuntimeError as e:
+                    self._slots.release()
+                    for _, future, _ in batch:
+                        future.set_exception(e)
+            else:
+                self._run(batch)
+            if stop:
+                return
+
+    def _run(self, batch):
+        started = time.perf_counter()
+        try:
+            try:
+                results = self._run_items([item for item, _, _ in batch])
+            except Exception as e:
+                self._record(batch, started, error=True)
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    return
+                with self._stats_lock:
+                    self._retried += len(batch)
+                for item, future, _ in batch:
+                    try:
+                        future.set_result(self._run_items([item])[0])
+                    except Exception as e:
+                        future.set_exception(e)
+                return
+            self._record(batch, started)
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def _run_items(self, items):
+        results = self.run_batch(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"Batch returned {len(results)} results for {len(items)} items")
+        return results
+
+    def _record(self, batch, started, error=False):
+        size = len(batch)
+        waits = [started - enqueued for _, _, enqueued in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._errors += int(error)
+            self._max_batch = max(self._max_batch, size)
+            for bucket in BATCH_SIZE_BUCKETS:
+                if size <= bucket:
+                    self._size_buckets[f"<={bucket}"] += 1
+                    break
+            else:
+                self._size_buckets["+Inf"] += 1
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+            self._run_total += time.perf_counter() - started
+
+    def stats(self):
+        with self._stats_lock:
+            batches, items = self._batches, self._items
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": batches,
+                "items": items,
+                "errors": self._errors,
+                "retried_items": self._retried,
+                "queued": self._queue.qsize(),
+                "avg_batch_size": round(items / batches, 2) if batches else 0.0,
+                "largest_batch": self._max_batch,
+                "batch_size_histogram": dict(self._size_buckets),
+                "avg_queue_wait_ms": round(self._wait_total / items * 1000.0, 3) if items else 0.0,
+                "max_queue_wait_ms": round(self._wait_max * 1000.0, 3),
+                "avg_batch_run_ms": round(self._run_total / batches * 1000.0, 3) if batches else 0.0,
+            }
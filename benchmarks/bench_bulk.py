@@ -0,0 +1,83 @@
+"""One label against many user profiles: score_label in a loop vs. bulk.evaluate on columns.
+
+Usage: python benchmarks/bench_bulk.py [--sizes 1000,10000,100000] [--repeat 5]
+
+Profiles are random (diet, 0-3 allergies from a 40-name vocabulary, some
+without weight or height). Flags, scores and verdicts are checked against
+score_label for every profile; BMI may differ in the last digit (np.round).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np  # noqa: E402
+
+import app  # noqa: E402
+import bulk  # noqa: E402
+
+DIETS = ["No restrictions", "Vegan", "Vegetarian", "Keto", "Low-carb", "Diabetic", "Gluten-free"]
+ALLERGENS = ["milk", "soy", "wheat", "nuts", "egg", "sesame", "peanut", "fish", "shellfish", "mustard", "celery",
+             "lupin", "sulphite", "gluten", "almond", "cashew", "hazelnut", "walnut", "pistachio", "oat", "barley",
+             "rye", "corn", "cocoa", "honey", "gelatin", "whey", "casein", "lactose", "yeast", "garlic", "onion",
+             "tomato", "strawberry", "kiwi", "banana", "avocado", "coconut", "palm", "sugar"]
+
+
+def random_profiles(n, rng):
+    return [app.build_user_profile("Unspecified", rng.randint(5, 90),
+                                   0.0 if rng.random() < 0.05 else rng.uniform(20, 120),
+                                   rng.uniform(100, 200), rng.choice(DIETS),
+                                   ", ".join(rng.sample(ALLERGENS, rng.randint(0, 3))))
+            for _ in range(n)]
+
+
+def best_of(fn, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def check(facts, profiles, columns):
+    for i, profile in enumerate(profiles):
+        expected = app.score_label(facts, profile)
+        assert columns["health_score"][i] == expected["analysis"]["health_score"]["score"], i
+        assert bulk.VERDICTS[columns["verdict"][i]] == expected["analysis"]["verdict"], i
+        flags = expected["risk_tags"][len(facts["risks"]):]
+        assert columns["allergy_hit"][i] == any(f.startswith("Contains allergen") for f in flags), i
+        assert columns["diet_conflict"][i] == any(not f.startswith("Contains allergen") for f in flags), i
+        bmi = expected["personalization"]["bmi"]
+        assert (bmi is None and np.isnan(columns["bmi"][i])) or abs(columns["bmi"][i] - bmi) < 0.051, i
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    text = "Ingredients: oats, wheat flour, milk solids, sugar, soy lecithin, almonds, vitamin c. Net wt 200g"
+    facts = app.extract_label_facts(text, [])
+    print(f"{'profiles':>9} {'encode ms':>10} {'loop us/profile':>16} {'bulk us/profile':>16} {'speedup':>8}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        profiles = random_profiles(n, rng)
+        start = time.perf_counter()
+        table = bulk.ProfileTable.from_profiles(profiles)
+        encode_ms = (time.perf_counter() - start) * 1000
+        loop, _ = best_of(lambda: [app.score_label(facts, p) for p in profiles], max(1, args.repeat // 2))
+        vectorized, columns = best_of(lambda: bulk.evaluate(facts, table), args.repeat)
+        check(facts, profiles, columns)
+        print(f"{n:>9} {encode_ms:>10.1f} {loop / n * 1e6:>16.3f} {vectorized / n * 1e6:>16.3f} "
+              f"{loop / vectorized:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
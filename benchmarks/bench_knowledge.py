@@ -0,0 +1,85 @@
+"""Time consumption-advice lookups: linear INGREDIENT_KNOWLEDGE scan vs. the compiled IngredientIndex.
+
+Usage: python benchmarks/bench_knowledge.py [--sizes 20,2000,20000,50000] [--ingredients 30]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge import IngredientIndex  # noqa: E402
+
+
+FALLBACK = {
+    "risky": ["sugar", "salt", "oil", "butter", "cream", "fried", "syrup"],
+    "moderate": ["milk", "cheese", "bread", "rice", "pasta", "nuts"],
+    "healthy": ["apple", "banana", "carrot", "spinach", "oats", "lentil"],
+}
+LABEL = ["sugar", "refined wheat flour", "palm oil", "milk solids", "iodised salt", "cocoa solids",
+         "emulsifier", "raising agent", "invert syrup", "whole wheat", "oats", "tomato paste"]
+
+
+def synthetic_knowledge(n, rng):
+    knowledge = {}
+    levels = ("risky", "moderate", "healthy")
+    while len(knowledge) < n:
+        name = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 14)))
+        knowledge[name] = {"type": rng.choice(levels), "effects": [f"effect {len(knowledge) % 50}"],
+                           "recommendation": f"recommendation {len(knowledge) % 20}"}
+    return knowledge
+
+
+def linear_lookup(ingredients, knowledge):
+    out = []
+    for ing in ingredients:
+        key = ing.lower()
+        for name, info in knowledge.items():
+            if name in key:
+                out.append(info["type"])
+                break
+        else:
+            for level, words in FALLBACK.items():
+                if any(w in key for w in words):
+                    out.append(level)
+                    break
+            else:
+                out.append("unknown")
+    return out
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="20,2000,20000,50000")
+    parser.add_argument("--ingredients", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    ingredients = [rng.choice(LABEL) for _ in range(args.ingredients)]
+    print(f"{'entries':>8} {'build ms':>9} {'linear ms':>10} {'index ms':>9} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        knowledge = synthetic_knowledge(size, rng)
+        start = time.perf_counter()
+        index = IngredientIndex(knowledge, FALLBACK)
+        build_ms = (time.perf_counter() - start) * 1000
+        assert linear_lookup(ingredients, knowledge) == [p["level"] for p in index.advise(ingredients)]
+        linear = best_of(lambda: linear_lookup(ingredients, knowledge), args.repeat)
+        indexed = best_of(lambda: index.advise(ingredients), args.repeat)
+        print(f"{size:>8} {build_ms:>9.1f} {linear:>10.3f} {indexed:>9.3f} {linear / indexed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Latency, memory and accuracy parity of the NER inference backends.
+
+Usage: python benchmarks/bench_ner_backends.py [--backends torch,torch-int8,onnx] [--texts labels.txt]
+                                               [--repeat 5] [--min-f1 0.95]
+
+Each backend is loaded in its own subprocess so resident memory is measured in
+isolation. Entities from every backend are compared with the fp32 ``torch``
+reference; the script exits with status 1 if any backend's F1 falls below
+``--min-f1``, so it doubles as an accuracy-parity check.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLE_TEXTS = [
+    "Ingredients: Refined wheat flour (maida), palm oil, iodised salt, wheat gluten, thickeners (508, 412), "
+    "acidity regulators (501(i), 500(i)) and humectant (451(i)).",
+    "Nutrition Facts: Energy 471 kcal, Protein 8.1 g, Carbohydrate 61.4 g, of which sugars 1.5 g, "
+    "Total fat 21.3 g, Saturated fat 9.8 g, Sodium 1180 mg.",
+    "Ingredients: Sugar, cocoa butter, whole milk powder, cocoa mass, emulsifier (soy lecithin), natural vanilla flavouring.",
+    "Wheat flour, sugar, edible vegetable oil (palm), invert syrup, raising agents, milk solids, salt, dough conditioner.",
+    "Orange juice from concentrate (99%), vitamin C, natural flavours. Per 100 ml: energy 45 kcal, sugars 10 g.",
+]
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_worker(backend, texts, repeat, out_path):
+    from app import MODEL_NAME, entities_to_dicts
+    from ner_backends import load_ner_pipeline
+
+    base_rss = rss_mb()
+    started = time.perf_counter()
+    ner = load_ner_pipeline(MODEL_NAME, backend)
+    load_s = time.perf_counter() - started
+    entities = [entities_to_dicts(ner(text)) for text in texts]
+
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            t = time.perf_counter()
+            ner(text)
+            latencies.append((time.perf_counter() - t) * 1000)
+    t = time.perf_counter()
+    for _ in range(repeat):
+        ner(list(texts), batch_size=len(texts))
+    batch_ms = (time.perf_counter() - t) * 1000 / (repeat * len(texts))
+
+    with open(out_path, "w") as f:
+        json.dump({
+            "backend": backend,
+            "load_s": load_s,
+            "rss_mb": rss_mb(),
+            "model_rss_mb": rss_mb() - base_rss,
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)],
+            "batched_ms_per_text": batch_ms,
+            "entities": entities,
+        }, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default="torch,torch-int8,onnx")
+    parser.add_argument("--texts", help="file with one label text per line (default: built-in samples)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-f1", type=float, default=0.95)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    texts = SAMPLE_TEXTS
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+    if args.worker:
+        run_worker(args.worker, texts, args.repeat, args.out)
+        return
+
+    from ner_backends import entity_parity
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "torch" not in backends:
+        backends.insert(0, "torch")
+    results = {}
+    for backend in backends:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+            out_path = tmp.name
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", backend, "--out", out_path,
+               "--repeat", str(args.repeat)] + (["--texts", args.texts] if args.texts else [])
+        proc = subprocess.run(cmd, cwd=ROOT)
+        if proc.returncode == 0:
+            with open(out_path) as f:
+                results[backend] = json.load(f)
+        else:
+            print(f"{backend}: failed to run (exit {proc.returncode})", file=sys.stderr)
+        os.unlink(out_path)
+
+    if "torch" not in results:
+        sys.exit("torch reference backend failed; nothing to compare against")
+    reference = results["torch"]["entities"]
+    print(f"{'backend':<12} {'load s':>7} {'RSS MB':>8} {'model MB':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'batch ms/text':>14} {'F1':>6} {'max dscore':>10}")
+    failed = False
+    for backend, r in results.items():
+        parity = entity_parity(reference, r["entities"])
+        failed = failed or parity["f1"] < args.min_f1
+        print(f"{backend:<12} {r['load_s']:>7.1f} {r['rss_mb']:>8.0f} {r['model_rss_mb']:>9.0f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['batched_ms_per_text']:>14.1f} {parity['f1']:>6.3f} {parity['max_score_delta']:>10.3f}")
+    if failed:
+        sys.exit(f"accuracy parity below F1 {args.min_f1}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""NER on long labels: the whole text in one model call vs. windows from NerChunker.
+
+Usage: python benchmarks/bench_ner_chunking.py [--lengths 1,2,4,8,16] [--repeat 3] [--backend torch]
+
+Labels are built by repeating a set of ingredient lists (with a running
+number on each ingredient so the copies differ) ``length`` times. For each
+length the script prints the model's token count, the windows used, the
+latency of both approaches and how far into the text entities were found
+("reach": end of the last entity as a share of the text). Unchunked calls
+past the model's 512-token limit fail or are truncated; chunked calls
+should keep latency per token flat and reach the end of the label.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import MODEL_NAME  # noqa: E402
+from ner_backends import NER_BACKEND, load_ner_pipeline  # noqa: E402
+from ner_chunks import NerChunker  # noqa: E402
+
+INGREDIENT_LISTS = [
+    "Ingredients: Refined wheat flour, palm oil, iodised salt, wheat gluten, thickeners, acidity regulators, humectant.",
+    "Ingredients: Sugar, cocoa butter, whole milk powder, cocoa mass, emulsifier (soy lecithin), vanilla flavouring.",
+    "Zutaten: Weizenmehl, Zucker, Palmfett, Magermilchpulver, Salz; Ingrédients: farine de blé, sucre, huile de palme.",
+    "Nutrition Facts: Energy 471 kcal\nProtein 8.1 g\nCarbohydrate 61.4 g\nTotal fat 21.3 g\nSodium 1180 mg\n",
+]
+
+
+def label(length):
+    parts = []
+    for copy in range(length):
+        for text in INGREDIENT_LISTS:
+            parts.append(text.replace(",", f" {copy},"))
+    return " ".join(parts)
+
+
+def reach(entities, text):
+    ends = [e["end"] for e in entities if e.get("end") is not None]
+    return max(ends) / len(text) if ends else 0.0
+
+
+def best_of(fn, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            return None, f"{type(e).__name__}"
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", default="1,2,4,8,16")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", default=NER_BACKEND)
+    args = parser.parse_args()
+
+    ner = load_ner_pipeline(MODEL_NAME, args.backend)
+    tokenizer = getattr(ner, "tokenizer", None)
+    chunker = NerChunker()
+    print(f"{'copies':>6} {'tokens':>7} {'windows':>7} {'whole ms':>9} {'reach':>6} {'chunked ms':>10} {'reach':>6} "
+          f"{'us/token':>9}")
+    for length in (int(s) for s in args.lengths.split(",")):
+        text = label(length)
+        tokens = sum(chunker.token_counts(tokenizer, [text]))
+        windows = chunker.windows(text, tokenizer)
+        whole, whole_entities = best_of(lambda: ner(text), args.repeat)
+        chunked, chunked_entities = best_of(lambda: chunker(ner, [text])[0], args.repeat)
+        whole_cols = (f"{whole * 1000:>9.1f} {reach(whole_entities, text):>6.0%}" if whole is not None
+                      else f"{whole_entities:>16}")
+        print(f"{length:>6} {tokens:>7} {len(windows):>7} {whole_cols} {chunked * 1000:>10.1f} "
+              f"{reach(chunked_entities, text):>6.0%} {chunked / tokens * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Per-stage timings of the analyze pipeline on synthetic labels.
+
+Usage: python benchmarks/bench_pipeline.py [--labels 5] [--resolutions small,medium,large]
+                                           [--noise clean,heavy] [--skip easyocr,ner] [--json out.json]
+
+Stages are timed separately, in pipeline order: JPEG decode, preprocess_image,
+Tesseract, EasyOCR, clean_and_deduplicate, NER, analyze_text (scoring with the
+NER entities already computed) and JSON serialization. Tesseract runs on the
+backend chosen by TESSERACT_BACKEND.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import app  # noqa: E402
+from ocr import tesseract_words  # noqa: E402
+from synthetic import encode, generate  # noqa: E402
+
+STAGES = ["decode", "preprocess_image", "tesseract", "easyocr", "clean_and_deduplicate", "ner",
+          "analyze_text", "json"]
+PROFILE = {"gender": "Unspecified", "age": 30, "weight": 70.0, "height": 170.0, "diet": "Vegetarian",
+           "allergies": ["milk"]}
+
+
+def timed(timings, stage, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    timings[stage].append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def run(labels, resolutions, noise_levels, skip):
+    easyocr_reader = None if "easyocr" in skip else app.easyocr_model.get(wait=True)
+    ner = None if "ner" in skip else app.ner_model.get(wait=True)
+    results = {}
+    for name, image, _ in generate(labels, resolutions, noise_levels):
+        key = name.split("_", 1)[1]
+        timings = results.setdefault(key, defaultdict(list))
+        data = encode(image)
+        img = timed(timings, "decode", lambda: Image.open(io.BytesIO(data)).convert("RGB"))
+        pre = timed(timings, "preprocess_image", app.preprocess_image, img)
+        text = timed(timings, "tesseract", tesseract_words, pre)[0].strip()
+        if easyocr_reader is not None:
+            easy = timed(timings, "easyocr", easyocr_reader.readtext, np.asarray(img))
+            text = text or " ".join(r[1] for r in easy)
+        timed(timings, "clean_and_deduplicate", app.clean_and_deduplicate, text)
+        entities = []
+        if ner is not None and text:
+            entities = timed(timings, "ner", lambda: app.entities_to_dicts(ner(text)))
+        analysis = timed(timings, "analyze_text", app.analyze_text, text, PROFILE, entities)
+        timed(timings, "json", json.dumps, analysis)
+    return results
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def summarize(results):
+    summary = {}
+    for key, timings in results.items():
+        summary[key] = {
+            stage: {
+                "mean_ms": round(statistics.fmean(values), 3),
+                "p50_ms": round(statistics.median(values), 3),
+                "p95_ms": round(percentile(values, 0.95), 3),
+            }
+            for stage, values in timings.items()
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--labels", type=int, default=5, help="distinct label texts per configuration")
+    parser.add_argument("--resolutions", default="small,medium,large")
+    parser.add_argument("--noise", default="clean,heavy")
+    parser.add_argument("--skip", default="", help="comma-separated stages to skip: easyocr, ner")
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    results = run(args.labels, args.resolutions.split(","), args.noise.split(","),
+                  {s.strip() for s in args.skip.split(",") if s.strip()})
+    summary = summarize(results)
+    for key, stages in summary.items():
+        print(f"\n{key}")
+        print(f"  {'stage':<24} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10}")
+        for stage in STAGES:
+            if stage in stages:
+                s = stages[stage]
+                print(f"  {stage:<24} {s['mean_ms']:>10.2f} {s['p50_ms']:>10.2f} {s['p95_ms']:>10.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
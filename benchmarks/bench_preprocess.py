@@ -0,0 +1,111 @@
+"""OCR preprocessing: the Pillow preprocess_image vs. the NumPy pipeline.
+
+Usage: python benchmarks/bench_preprocess.py [--resolutions small,medium,large] [--repeat 20]
+                                             [--pipelines grayscale,sharpen,contrast;grayscale,denoise,deskew,stretch,threshold]
+
+Each variant runs in its own subprocess, and peak RSS growth while it runs
+is measured from a reset high-water mark (Linux /proc; Pillow's allocations
+are invisible to tracemalloc). The default NumPy pipeline is also checked to be
+byte-identical to the Pillow path.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import RESOLUTIONS, random_label_text, render_label  # noqa: E402
+
+DEFAULT_PIPELINES = "grayscale,sharpen,contrast;grayscale,denoise,deskew,stretch,threshold"
+
+
+def _status_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def reset_peak_rss():
+    """Start a new peak-RSS window; returns the current RSS in MB (Linux only, else None)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return _status_mb("VmRSS")
+    except OSError:
+        return None
+
+
+def run_worker(variant, path, repeat):
+    import numpy as np
+    from PIL import Image
+
+    from app import preprocess_image
+    from preprocess import Preprocessor
+
+    image = Image.open(path).convert("RGB")
+    if variant == "pillow":
+        run = preprocess_image
+    else:
+        pre = Preprocessor(variant)
+        run = pre
+    gc.collect()
+    base = reset_peak_rss()
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        run(image)
+        times.append((time.perf_counter() - t) * 1000)
+    rss_growth = _status_mb("VmHWM") - base if base is not None else float("nan")
+    identical = None
+    if variant == "grayscale,sharpen,contrast":
+        identical = bool(np.array_equal(np.asarray(preprocess_image(image)), run(image)))
+    return {"p50_ms": statistics.median(times), "min_ms": min(times), "rss_growth_mb": rss_growth,
+            "identical": identical}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolutions", default="small,medium,large")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--pipelines", default=DEFAULT_PIPELINES, help="';'-separated NumPy step lists")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--image", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.image, args.repeat)))
+        return
+
+    variants = ["pillow"] + [p.strip() for p in args.pipelines.split(";") if p.strip()]
+    print(f"{'resolution':<10} {'variant':<48} {'p50 ms':>8} {'min ms':>8} {'peak RSS +MB':>13} {'identical':>9}")
+    for resolution in args.resolutions.split(","):
+        image = render_label(random_label_text(random.Random(0)), RESOLUTIONS[resolution], noise=0.04)
+        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+            image.save(tmp, format="PNG")
+        for variant in variants:
+            cmd = [sys.executable, os.path.abspath(__file__), "--worker", variant, "--image", tmp.name,
+                   "--repeat", str(args.repeat)]
+            proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"{resolution:<10} {variant:<48} failed: {proc.stderr.strip().splitlines()[-1:]}")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            identical = "" if r["identical"] is None else str(r["identical"])
+            print(f"{resolution:<10} {variant:<48} {r['p50_ms']:>8.1f} {r['min_ms']:>8.1f} "
+                  f"{r['rss_growth_mb']:>13.1f} {identical:>9}")
+        os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
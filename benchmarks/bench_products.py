@@ -0,0 +1,84 @@
+"""Product recognition on a synthetic catalog: build time, per-label latency and OCR-error tolerance.
+
+Usage: python benchmarks/bench_products.py [--sizes 12,5000,50000] [--labels 500]
+
+Labels are ingredient text with one catalog name inserted, mangled the way OCR
+does it (digit/letter swaps, a dropped or doubled letter, lost hyphens).
+"Cold" latency is the first pass over the labels, "warm" a repeat of it once
+token corrections are memoized.
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from products import ProductCatalog  # noqa: E402
+
+LABEL = ("Ingredients: refined wheat flour, sugar, palm oil, milk solids, iodised salt, "
+         "emulsifier (soy lecithin), raising agents. Net wt 100g. Best before 6 months.")
+OCR_SWAPS = {"o": "0", "l": "1", "e": "3", "s": "5", "i": "l", "a": "@"}
+
+
+def synthetic_catalog(n, rng):
+    names = set()
+    while len(names) < n:
+        words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+                 for _ in range(rng.randint(1, 3))]
+        names.add(" ".join(words))
+    return [(name, name.title()) for name in sorted(names)]
+
+
+def mangle(name, rng):
+    chars = list(name)
+    positions = [i for i, c in enumerate(chars) if c in OCR_SWAPS]
+    if positions and rng.random() < 0.7:
+        i = rng.choice(positions)
+        chars[i] = OCR_SWAPS[chars[i]]
+    elif len(chars) > 6:
+        i = rng.randrange(1, len(chars) - 1)
+        if chars[i] != " " and rng.random() < 0.5:
+            chars.insert(i, chars[i])
+        elif chars[i] != " ":
+            del chars[i]
+    return "".join(chars).replace(" ", rng.choice([" ", "-", " "]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="12,5000,50000")
+    parser.add_argument("--labels", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'catalog':>8} {'build ms':>9} {'cold us/label':>14} {'warm us/label':>14} {'exact':>6} {'mangled':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        rng = random.Random(size)
+        entries = synthetic_catalog(size, rng)
+        start = time.perf_counter()
+        catalog = ProductCatalog(entries)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        picks = [rng.choice(entries) for _ in range(args.labels)]
+        exact = [(f"{name} {LABEL}", display) for name, display in picks]
+        mangled = [(f"{mangle(name, rng)} {LABEL}", display) for name, display in picks]
+        texts = [text for text, _ in exact + mangled]
+
+        start = time.perf_counter()
+        for text in texts:
+            catalog.match(text)
+        cold_us = (time.perf_counter() - start) / len(texts) * 1e6
+        start = time.perf_counter()
+        for text in texts:
+            catalog.match(text)
+        warm_us = (time.perf_counter() - start) / len(texts) * 1e6
+
+        exact_ok = sum(catalog.match(text) == display for text, display in exact) / len(exact)
+        mangled_ok = sum(catalog.match(text) == display for text, display in mangled) / len(mangled)
+        print(f"{size:>8} {build_ms:>9.1f} {cold_us:>14.1f} {warm_us:>14.1f} {exact_ok:>6.1%} {mangled_ok:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Rescoring a label for many profiles: full analyze_text vs. cached facts + score_label.
+
+Usage: python benchmarks/bench_rescore.py [--labels 20] [--profiles 5] [--repeat 200]
+
+NER entities are taken as empty (the ingredient fallback), so the numbers
+show the scoring work alone.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app  # noqa: E402
+from synthetic import random_label_text  # noqa: E402
+
+DIETS = ["No restrictions", "Vegan", "Vegetarian", "Keto", "Diabetic", "Gluten-free"]
+ALLERGENS = ["milk", "soy", "wheat", "nuts", "egg", "sesame"]
+
+
+def family(n, rng):
+    return [app.build_user_profile("Unspecified", rng.randint(5, 80), rng.uniform(20, 110), rng.uniform(110, 195),
+                                   rng.choice(DIETS), ", ".join(rng.sample(ALLERGENS, rng.randint(0, 2))))
+            for _ in range(n)]
+
+
+def per_call_us(fn, calls, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--labels", type=int, default=20)
+    parser.add_argument("--profiles", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts = [random_label_text(rng) for _ in range(args.labels)]
+    profiles = family(args.profiles, rng)
+    facts = [app.extract_label_facts(text, []) for text in texts]
+    calls = len(texts) * len(profiles)
+
+    for text, label in zip(texts, facts):
+        for profile in profiles:
+            assert app.score_label(label, profile) == app.analyze_text(text, profile, [])
+
+    full = per_call_us(lambda: [app.analyze_text(t, p, []) for t in texts for p in profiles], calls, args.repeat)
+    extract = per_call_us(lambda: [app.extract_label_facts(t, []) for t in texts], len(texts), args.repeat)
+    score = per_call_us(lambda: [app.score_label(f, p) for f in facts for p in profiles], calls, args.repeat)
+    print(f"{args.labels} labels x {args.profiles} profiles")
+    print(f"analyze_text per profile:        {full:8.1f} us")
+    print(f"extract_label_facts per label:   {extract:8.1f} us")
+    print(f"score_label per profile:         {score:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
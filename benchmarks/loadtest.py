@@ -0,0 +1,132 @@
+"""Offline load generator for the /analyze endpoint.
+
+Usage: python benchmarks/loadtest.py [--concurrency 8] [--requests 200] [--workers 2]
+                                     [--resolution medium] [--noise light] [--distinct 20]
+       python benchmarks/loadtest.py --url http://127.0.0.1:8000 ...
+
+Without --url a local uvicorn is started on a free port (and stopped
+afterwards). Synthetic labels are posted with the given concurrency; the
+report shows throughput, latency percentiles and status codes. Use
+--distinct to control how often the same image repeats (label cache hits).
+"""
+import argparse
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import NOISE_LEVELS, RESOLUTIONS, encode, random_label_text, render_label  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, startup_timeout):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"uvicorn exited with status {proc.returncode}")
+        try:
+            if requests.get(f"{url}/healthz", timeout=1).ok:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    proc.terminate()
+    sys.exit("uvicorn did not become healthy in time")
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--endpoint", default="/analyze")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting a local server")
+    parser.add_argument("--resolution", choices=sorted(RESOLUTIONS), default="medium")
+    parser.add_argument("--noise", choices=sorted(NOISE_LEVELS), default="light")
+    parser.add_argument("--distinct", type=int, default=20, help="number of distinct label images")
+    parser.add_argument("--wait-ready", default="", help="models to wait for via /readyz?require=..., e.g. ner")
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    images = [encode(render_label(random_label_text(rng), RESOLUTIONS[args.resolution], NOISE_LEVELS[args.noise], seed=i))
+              for i in range(args.distinct)]
+
+    proc = None
+    url = args.url
+    if not url:
+        proc, url = start_server(args.workers, args.startup_timeout)
+    try:
+        if args.wait_ready:
+            deadline = time.time() + args.startup_timeout
+            while requests.get(f"{url}/readyz", params={"require": args.wait_ready}, timeout=5).status_code != 200:
+                if time.time() > deadline:
+                    sys.exit("models did not become ready in time")
+                time.sleep(0.5)
+
+        local = threading.local()
+
+        def one(i):
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+            files = {"file": (f"label{i}.jpg", images[i % len(images)], "image/jpeg")}
+            start = time.perf_counter()
+            try:
+                status = session.post(f"{url}{args.endpoint}", files=files, data={"diet": "Vegetarian"},
+                                      timeout=args.timeout).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            return status, (time.perf_counter() - start) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(one, range(args.requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    statuses = Counter(status for status, _ in results)
+    ok = [ms for status, ms in results if status == 200]
+    print(f"requests: {len(results)}  concurrency: {args.concurrency}  elapsed: {elapsed:.2f}s")
+    print(f"throughput: {len(results) / elapsed:.2f} req/s ({len(ok) / elapsed:.2f} ok/s)")
+    print("status codes: " + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items(), key=str)))
+    if ok:
+        print(f"latency ms (200s): p50={percentile(ok, 0.50):.1f} p95={percentile(ok, 0.95):.1f} "
+              f"p99={percentile(ok, 0.99):.1f} mean={statistics.fmean(ok):.1f} max={max(ok):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Synthetic food-label images for benchmarks and load tests.
+
+Labels are rendered with Pillow: an optional product name, an "Ingredients:"
+paragraph and a short nutrition table, at a chosen resolution, then degraded
+with Gaussian noise, blur and a slight rotation to mimic phone photos.
+"""
+import io
+import random
+import textwrap
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+INGREDIENTS = [
+    "sugar", "refined wheat flour", "palm oil", "milk solids", "iodised salt", "cocoa solids", "whole wheat",
+    "invert syrup", "emulsifier (soy lecithin)", "raising agents", "oats", "dietary fiber", "vitamin c",
+    "hydrogenated vegetable fat", "glucose syrup", "almonds", "honey", "butter", "cream", "tomato paste",
+    "spinach powder", "lentil flour", "preservative (211)", "artificial flavouring", "calcium carbonate",
+]
+PRODUCTS = ["Maggi Noodles", "Oreo", "Parle G", "Marie Gold", "Dairy Milk", "Lays Classic", "Tropicana", ""]
+NUTRIENTS = ["Energy", "Protein", "Carbohydrate", "Total Sugars", "Total Fat", "Saturated Fat", "Sodium"]
+
+RESOLUTIONS = {"small": (800, 600), "medium": (1600, 1200), "large": (3000, 4000)}
+NOISE_LEVELS = {"clean": 0.0, "light": 0.04, "heavy": 0.12}
+
+
+def random_label_text(rng: random.Random, n_ingredients=12):
+    product = rng.choice(PRODUCTS)
+    ingredients = rng.sample(INGREDIENTS, k=min(n_ingredients, len(INGREDIENTS)))
+    nutrition = [f"{name} {rng.randint(1, 500)} {'kcal' if name == 'Energy' else 'g'}" for name in NUTRIENTS]
+    lines = [product] if product else []
+    lines += textwrap.wrap("Ingredients: " + ", ".join(ingredients) + ".", width=48)
+    lines += ["", "Nutrition Facts (per 100 g)"] + nutrition
+    return "\n".join(lines)
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def render_label(text: str, size=(1600, 1200), noise=0.0, seed=0) -> Image.Image:
+    rng = random.Random(seed)
+    width, height = size
+    lines = text.splitlines()
+    font_size = max(10, int(height / (len(lines) + 4) * 0.7))
+    image = Image.new("RGB", size, (250, 248, 240))
+    draw = ImageDraw.Draw(image)
+    font = _font(font_size)
+    y = int(font_size * 1.5)
+    for line in lines:
+        draw.text((int(width * 0.05), y), line, fill=(20, 20, 20), font=font)
+        y += int(font_size * 1.3)
+    if noise > 0:
+        image = image.rotate(rng.uniform(-3, 3) * noise * 10, resample=Image.BILINEAR, fillcolor=(250, 248, 240))
+        image = image.filter(ImageFilter.GaussianBlur(radius=noise * 10))
+        pixels = np.asarray(image, dtype=np.float32)
+        pixels += np.random.default_rng(seed).normal(0, noise * 255, pixels.shape).astype(np.float32)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return image
+
+
+def encode(image: Image.Image, fmt="JPEG", quality=90) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format=fmt, quality=quality)
+    return buf.getvalue()
+
+
+def generate(count, resolutions=("medium",), noise_levels=("clean",), seed=0):
+    """Yield (name, image, ground_truth_text) for every resolution x noise combination."""
+    rng = random.Random(seed)
+    for i in range(count):
+        text = random_label_text(rng)
+        for res in resolutions:
+            for noise in noise_levels:
+                image = render_label(text, RESOLUTIONS[res], NOISE_LEVELS[noise], seed=seed + i)
+                yield f"label{i:04d}_{res}_{noise}", image, text
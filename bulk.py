@@ -0,0 +1,154 @@
+"""Columnar evaluation of one label against many user profiles.
+
+``score_label`` in app.py scores one profile at a time. Here a whole user
+base is held as NumPy columns (a ``ProfileTable``), and one label's facts
+(``extract_label_facts``) are applied to all of it with a handful of
+vectorized operations:
+
+- diets are small integer codes, and a per-label lookup table says which
+  codes the label conflicts with;
+- allergies are bitsets over the table's allergen vocabulary, and the label
+  contributes one mask of the allergens found in its tokens;
+- BMI and score are plain array arithmetic.
+
+Flags and scores match ``score_label`` for every profile. BMI is rounded
+with ``np.round``, which can differ from Python's ``round`` in the last
+digit for values that fall exactly between two tenths.
+"""
+import numpy as np
+
+BMI_BOUNDS = (18.5, 25.0, 30.0)
+BMI_CATEGORIES = ("Underweight", "Normal", "Overweight", "Obese", "Unknown")
+VERDICT_BOUNDS = (40, 60, 80)
+VERDICTS = ("Unhealthy", "Caution", "Moderate", "Healthy")
+RISK_PENALTY = 8
+ALLERGY_PENALTY = 20
+DIET_PENALTY = 5
+PROFILE_COLUMNS = ("weight", "height", "diet", "allergies")
+
+
+def _normalize_diet(diet):
+    return (diet or "No restrictions").lower()
+
+
+def _allergy_list(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [a.strip().lower() for a in value if a and a.strip()]
+
+
+class ProfileTable:
+    """User profiles as columns.
+
+    ``weight`` and ``height`` are float arrays (NaN or 0 when unknown),
+    ``diet`` an int array of indexes into ``diets`` (lowercase diet names),
+    and ``allergies`` a ``(n, words)`` uint64 array whose bit ``i`` stands
+    for ``allergens[i]``.
+    """
+
+    def __init__(self, weight, height, diet, allergies, diets, allergens):
+        self.weight = np.asarray(weight, dtype=np.float64)
+        self.height = np.asarray(height, dtype=np.float64)
+        self.diet = np.asarray(diet, dtype=np.intp)
+        self.diets = list(diets)
+        self.allergens = list(allergens)
+        allergies = np.asarray(allergies, dtype=np.uint64)
+        # The word count is explicit so an empty table keeps its (0, words) shape.
+        words = allergies.shape[-1] if allergies.ndim > 1 else max(1, -(-len(self.allergens) // 64))
+        self.allergies = allergies.reshape(len(self.weight), words)
+
+    def __len__(self):
+        return len(self.weight)
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Encode a pandas DataFrame, or any mapping of equal-length columns.
+
+        Needs ``weight``, ``height``, ``diet`` (names, None for no
+        restriction) and ``allergies`` (comma-separated strings or lists).
+        Raises ValueError when the columns differ in length.
+        """
+        lengths = {name: len(columns[name]) for name in PROFILE_COLUMNS}
+        if len(set(lengths.values())) > 1:
+            raise ValueError("columns must have equal lengths, got "
+                             + ", ".join(f"{name}={n}" for name, n in lengths.items()))
+        diet_names = [_normalize_diet(d) for d in columns["diet"]]
+        diets = sorted(set(diet_names))
+        diet_codes = {d: i for i, d in enumerate(diets)}
+
+        allergy_lists = [_allergy_list(a) for a in columns["allergies"]]
+        allergens = sorted({a for allergies in allergy_lists for a in allergies})
+        bits = {a: i for i, a in enumerate(allergens)}
+        words = max(1, -(-len(allergens) // 64))
+        allergy_bits = np.zeros((len(allergy_lists), words), dtype=np.uint64)
+        for row, allergies in enumerate(allergy_lists):
+            for a in allergies:
+                word, bit = divmod(bits[a], 64)
+                allergy_bits[row, word] |= np.uint64(1 << bit)
+
+        weight = np.asarray(columns["weight"], dtype=np.float64)
+        height = np.asarray(columns["height"], dtype=np.float64)
+        return cls(weight, height, [diet_codes[d] for d in diet_names], allergy_bits, diets, allergens)
+
+    @classmethod
+    def from_profiles(cls, profiles):
+        """Encode a list of ``build_user_profile`` dicts."""
+        return cls.from_columns({
+            "weight": [p.get("weight") or 0.0 for p in profiles],
+            "height": [p.get("height") or 0.0 for p in profiles],
+            "diet": [p.get("diet") for p in profiles],
+            "allergies": [p.get("allergies") for p in profiles],
+        })
+
+    def label_masks(self, facts):
+        """The label's diet-conflict table and allergen mask in this table's encoding."""
+        conflicts = set(facts["diet_conflicts"])
+        diet_conflict = np.array([d in conflicts for d in self.diets], dtype=bool)
+        mask = np.zeros(self.allergies.shape[1], dtype=np.uint64)
+        tokens = facts["tokens"]
+        for i, allergen in enumerate(self.allergens):
+            if allergen in tokens:
+                word, bit = divmod(i, 64)
+                mask[word] |= np.uint64(1 << bit)
+        return diet_conflict, mask
+
+
+def compute_bmi_columns(weight, height):
+    """(bmi, category code into BMI_CATEGORIES); NaN and "Unknown" where weight or height is missing."""
+    known = (np.nan_to_num(weight) != 0) & (np.nan_to_num(height) != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bmi = np.round(weight / (height / 100.0) ** 2, 1)
+    bmi[~known] = np.nan
+    category = np.searchsorted(BMI_BOUNDS, bmi, side="right")
+    category[~known] = len(BMI_CATEGORIES) - 1
+    return bmi, category
+
+
+def evaluate(facts, table: ProfileTable):
+    """Score one label for every profile in ``table``.
+
+    Returns a dict of equal-length arrays: ``bmi``, ``bmi_category`` (codes
+    into BMI_CATEGORIES), ``allergy_hit``, ``diet_conflict``,
+    ``health_score`` and ``verdict`` (codes into VERDICTS). Pass it to
+    ``pandas.DataFrame`` for a frame.
+    """
+    diet_conflict_table, allergen_mask = table.label_masks(facts)
+    allergy_hit = (table.allergies & allergen_mask).any(axis=1)
+    diet_conflict = diet_conflict_table[table.diet] if len(table.diets) else np.zeros(len(table), dtype=bool)
+
+    score = np.full(len(table), 100 - RISK_PENALTY * len(set(facts["risks"])), dtype=np.int32)
+    score -= ALLERGY_PENALTY * allergy_hit
+    score -= DIET_PENALTY * diet_conflict
+    np.clip(score, 0, 100, out=score)
+
+    bmi, bmi_category = compute_bmi_columns(table.weight, table.height)
+    return {
+        "bmi": bmi,
+        "bmi_category": bmi_category,
+        "allergy_hit": allergy_hit,
+        "diet_conflict": diet_conflict,
+        "health_score": score,
+        "verdict": np.searchsorted(VERDICT_BOUNDS, score, side="right"),
+    }
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from workers import env_int
+
+
+LABEL_CACHE_SIZE = env_int("LABEL_CACHE_SIZE", 512)
+LABEL_CACHE_TTL = env_int("LABEL_CACHE_TTL", 24 * 3600)
+LABEL_CACHE_DIR = os.getenv("LABEL_CACHE_DIR", "")
+LABEL_CACHE_PRUNE_EVERY = env_int("LABEL_CACHE_PRUNE_EVERY", 1000)
+HASH_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def content_hash(contents: bytes) -> str:
+    return hashlib.sha256(contents).hexdigest()
+
+
+def is_content_hash(key) -> bool:
+    return isinstance(key, str) and HASH_RE.fullmatch(key) is not None
+
+
+class LabelCache:
+    """Maps an image content hash to its OCR text and NER entities.
+
+    The first tier is an in-memory LRU with a TTL; the optional second tier is
+    a directory of JSON files (one per hash) that survives restarts and can be
+    shared by several workers on the same host. Only profile-independent data
+    is stored, so scoring is always recomputed for the caller's profile.
+    ``aget`` / ``aput`` do the file I/O in a worker thread, off the event
+    loop. Every ``prune_every`` disk writes, expired files are removed.
+    """
+
+    def __init__(self, max_entries=LABEL_CACHE_SIZE, ttl=LABEL_CACHE_TTL, directory=LABEL_CACHE_DIR,
+                 prune_every=LABEL_CACHE_PRUNE_EVERY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self.directory = directory or None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._disk_puts = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.pruned = 0
+
+    async def aget(self, key):
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None:
+            found = await asyncio.to_thread(self._disk_get, key, now) if self._path(key) else None
+            value = self._disk_result(key, found, now)
+        return value
+
+    async def aput(self, key, value):
+        with self._lock:
+            self._remember(key, value, time.time())
+        if self._path(key):
+            await asyncio.to_thread(self._disk_put, key, value)
+
+    def _memory_get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._entries[key]
+        return None
+
+    def _disk_result(self, key, value, now):
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, value, now)
+        return value
+
+    def _remember(self, key, value, now):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        # Only content hashes get a file, so no key can name a path outside the directory.
+        if not self.directory or not is_content_hash(key):
+            return None
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _disk_get(self, key, now):
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            if now - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, value):
+        path = self._path(key)
+        if path is None:
+            return
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print("Label cache write failed:", e)
+        with self._lock:
+            self._disk_puts += 1
+            prune = self.prune_every > 0 and self._disk_puts % self.prune_every == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Remove expired entries (and stale temporary files) from the disk tier; returns how many."""
+        if not self.directory or not self._prune_lock.acquire(blocking=False):
+            return 0
+        removed, cutoff = 0, time.time() - self.ttl
+        try:
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith((".json", ".tmp")):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        if os.path.getmtime(path) < cutoff:
+                            os.remove(path)
+                            removed += 1
+                    except OSError:
+                        pass
+        finally:
+            self._prune_lock.release()
+        with self._lock:
+            self.pruned += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "disk_dir": self.directory,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "pruned": self.pruned,
+            }
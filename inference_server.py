@@ -0,0 +1,184 @@
+"""Single-process model server shared by all HTTP workers on a host.
+
+Run it next to uvicorn and point the workers at its socket:
+
+    python inference_server.py --socket /tmp/nutriscan.sock
+    MODEL_SERVER_SOCKET=/tmp/nutriscan.sock uvicorn app:app --workers 8
+
+Only this process loads EasyOCR and the NER model. Workers decode the upload,
+write the pixels into a POSIX shared-memory block and send the block's name
+over a Unix socket; the server wraps that memory as a PIL image without
+copying it. NER texts from all workers go through one micro-batcher here.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+from ocr import normalize_resolution
+
+HEADER = struct.Struct("!I")
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+
+
+def send_message(sock, message):
+    payload = json.dumps(message).encode("utf-8")
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def recv_exactly(sock, n):
+    chunks, remaining = [], n
+    while remaining:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            raise ConnectionError("model server connection closed")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock):
+    (length,) = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    return json.loads(recv_exactly(sock, length))
+
+
+def attach_shared_memory(name):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # The creator owns the block; stop this process's resource tracker from unlinking it.
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+class InferenceClient:
+    """Client used by HTTP workers; one persistent connection per thread."""
+
+    def __init__(self, socket_path=MODEL_SERVER_SOCKET, timeout=120):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _call(self, message):
+        sock = getattr(self._local, "sock", None)
+        for attempt in range(2):
+            if sock is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                self._local.sock = sock
+            try:
+                send_message(sock, message)
+                reply = recv_message(sock)
+                break
+            except OSError as e:
+                sock.close()
+                sock = self._local.sock = None
+                # A stale connection (server restarted) is retried once; a timeout is not.
+                if attempt or isinstance(e, socket.timeout):
+                    raise
+        if not reply.get("ok"):
+            raise RuntimeError(f"model server error: {reply.get('error')}")
+        return reply.get("result")
+
+    def ocr(self, image: Image.Image):
+        """OCR a decoded image on the server; returns (text, trace)."""
+        image = normalize_resolution(image).convert("RGBA")
+        pixels = image.tobytes()
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(pixels)))
+        try:
+            shm.buf[:len(pixels)] = pixels
+            del pixels
+            result = self._call({"op": "ocr", "shm": shm.name, "size": list(image.size)})
+        finally:
+            shm.close()
+            shm.unlink()
+        return result["text"], result["trace"]
+
+    def ner(self, texts):
+        return self._call({"op": "ner", "texts": list(texts)})
+
+    def status(self):
+        return self._call({"op": "status"})
+
+
+class InferenceHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                message = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                reply = {"ok": True, "result": self.server.dispatch(message)}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            send_message(self.request, reply)
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, ocr_slots):
+        os.environ["MODEL_SERVER_SOCKET"] = ""
+        import app as pipeline
+
+        self.pipeline = pipeline
+        self.ocr_slots = threading.Semaphore(ocr_slots)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, InferenceHandler)
+
+    def dispatch(self, message):
+        op = message.get("op")
+        if op == "ocr":
+            return self.ocr(message["shm"], tuple(message["size"]))
+        if op == "ner":
+            futures = [self.pipeline.ner_batcher.submit(text) for text in message["texts"]]
+            return [future.result() for future in futures]
+        if op == "status":
+            return self.pipeline.models.statuses()
+        raise ValueError(f"unknown op {op!r}")
+
+    def ocr(self, name, size):
+        shm = attach_shared_memory(name)
+        view = shm.buf[:size[0] * size[1] * 4]
+        image = None
+        try:
+            image = Image.frombuffer("RGBA", size, view, "raw", "RGBA", 0, 1)
+            with self.ocr_slots:
+                text, trace = self.pipeline.extract_text_traced(image)
+            return {"text": text, "trace": trace}
+        finally:
+            image = None
+            view.release()
+            shm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NutriScan shared model server")
+    parser.add_argument("--socket", default=MODEL_SERVER_SOCKET or "/tmp/nutriscan.sock")
+    parser.add_argument("--ocr-slots", type=int, default=os.cpu_count() or 1,
+                        help="images OCR'd concurrently (default: number of CPU cores)")
+    args = parser.parse_args()
+
+    server = InferenceServer(args.socket, args.ocr_slots)
+    server.pipeline.models.warm_up()
+    print(f"Model server listening on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
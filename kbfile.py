@@ -0,0 +1,317 @@
+"""Versioned knowledge-base files and a watcher that hot-swaps them.
+
+The knowledge tables (ingredient knowledge, advice fallbacks, products,
+keyword lists, diet restrictions) are compiled into one file:
+
+    header   magic "NSKB", format version, section count, knowledge version,
+             creation time, SHA-256 of everything after the header
+    sections one (name, offset, length) entry per section, 8-byte aligned
+    body     the large tables in fixed layouts, the small ones as compact JSON:
+             ingredient_names   string table (see below), in priority order
+             ingredient_levels  one level code byte per ingredient
+             ingredient_advice  one uint32 advice id per ingredient
+             advice             string table of JSON [level, effects, recommendation]
+             products           string table of alias, display name pairs
+             product_keywords, risk_keywords, benefit_keywords,
+             net_weight_keywords, diet_restrictions   JSON
+
+A string table is a uint32 count, count + 1 uint32 offsets and one UTF-8
+blob; string i is blob[offsets[i]:offsets[i + 1]]. Integers are
+little-endian.
+
+Every worker maps the file read-only and keeps the mapping open for as long
+as the knowledge built from it is in use. Names, levels, advice and product
+display names are read in place through memoryviews, so their pages live
+once in the page cache however many workers there are; a worker only
+builds the indexes it searches with (the keyword automata and the product
+trigram index) plus a bounded cache of decoded advice. Files are replaced
+with an atomic rename (``write_knowledge_file`` does this), so a reader
+never sees a half-written file, and a mapping of the old file stays valid
+until the last request using it lets go.
+
+    python kbfile.py build knowledge.nskb [--version N]
+    python kbfile.py info knowledge.nskb
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from knowledge import IngredientTable, compile_ingredients
+from workers import env_int
+
+KNOWLEDGE_FILE = os.getenv("KNOWLEDGE_FILE", "")
+KNOWLEDGE_POLL_SECONDS = env_int("KNOWLEDGE_POLL_SECONDS", 5)
+
+MAGIC = b"NSKB"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sHHQQ32s")  # magic, format, sections, version, created, sha256
+SECTION = struct.Struct("<32sQQ")  # name, offset, length
+ALIGN = 8
+TABLES = ("ingredient_knowledge", "advice_fallback", "product_keywords", "products", "risk_keywords",
+          "benefit_keywords", "net_weight_keywords", "diet_restrictions")
+JSON_SECTIONS = ("product_keywords", "risk_keywords", "benefit_keywords", "net_weight_keywords", "diet_restrictions")
+SECTIONS = ("ingredient_names", "ingredient_levels", "ingredient_advice", "advice", "products") + JSON_SECTIONS
+
+
+class KnowledgeFileError(ValueError):
+    pass
+
+
+def compile_tables(tables):
+    """The plain tables (as ``app.builtin_tables()`` returns them) in the shape
+    ``KnowledgeFile.tables()`` returns, for building a knowledge base without a file."""
+    compiled = {name: tables[name] for name in JSON_SECTIONS}
+    compiled["ingredients"] = compile_ingredients(tables["ingredient_knowledge"], tables["advice_fallback"])
+    compiled["products"] = [tuple(entry) for entry in tables["products"]]
+    return compiled
+
+
+def _uint32s(values):
+    values = array("I", values)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def pack_strings(strings):
+    blobs = [s.encode() for s in strings]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return _uint32s([len(blobs)] + offsets) + b"".join(blobs)
+
+
+class StringTable:
+    """A read-only sequence of strings over a packed string table."""
+
+    def __init__(self, view):
+        count = int.from_bytes(view[:4], "little")
+        self._offsets = view[4:8 + 4 * count].cast("I")
+        self._blob = view[8 + 4 * count:]
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(self._count))
+
+
+class StringPairs:
+    """``(table[2i], table[2i + 1])`` pairs of a string table."""
+
+    def __init__(self, strings):
+        self._strings = strings
+
+    def __len__(self):
+        return len(self._strings) // 2
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._strings[2 * i], self._strings[2 * i + 1]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def write_knowledge_file(path, tables, version=None):
+    """Compile ``tables`` into ``path`` atomically; returns the version written."""
+    missing = [name for name in TABLES if name not in tables]
+    if missing:
+        raise KnowledgeFileError(f"Missing tables: {', '.join(missing)}")
+    version = int(time.time()) if version is None else version
+    compiled = compile_tables(tables)
+    ingredients = compiled["ingredients"]
+    blobs = {
+        "ingredient_names": pack_strings(ingredients.names),
+        "ingredient_levels": bytes(ingredients.levels),
+        "ingredient_advice": _uint32s(ingredients.advice_ids),
+        "advice": pack_strings(ingredients.advice),
+        "products": pack_strings(s for entry in compiled["products"] for s in entry),
+    }
+    for name in JSON_SECTIONS:
+        blobs[name] = json.dumps(compiled[name], separators=(",", ":"), ensure_ascii=False).encode()
+    entries, body, offset = [], [], HEADER.size + SECTION.size * len(SECTIONS)
+    for name in SECTIONS:
+        padding = -offset % ALIGN
+        body.append(b"\0" * padding + blobs[name])
+        offset += padding
+        entries.append(SECTION.pack(name.encode(), offset, len(blobs[name])))
+        offset += len(blobs[name])
+    payload = b"".join(entries + body)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(blobs), version, int(time.time()), hashlib.sha256(payload).digest())
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return version
+
+
+class KnowledgeFile:
+    """A validated, memory-mapped knowledge file.
+
+    ``tables()`` returns views over the mapping (JSON sections are decoded),
+    which keep it mapped for as long as they are referenced; ``close()`` is
+    only for a file that has not been loaded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.signature = file_signature(os.fstat(f.fileno()))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except Exception:
+            self._map.close()
+            raise
+
+    def _parse(self):
+        view = memoryview(self._map)
+        try:
+            if len(view) < HEADER.size:
+                raise KnowledgeFileError(f"{self.path}: truncated header")
+            magic, fmt, count, self.version, self.created, digest = HEADER.unpack_from(view)
+            if magic != MAGIC:
+                raise KnowledgeFileError(f"{self.path}: not a knowledge file")
+            if fmt != FORMAT_VERSION:
+                raise KnowledgeFileError(f"{self.path}: format {fmt}, expected {FORMAT_VERSION}")
+            if sys.byteorder != "little":
+                raise KnowledgeFileError(f"{self.path}: knowledge files can only be mapped on little-endian hosts")
+            if hashlib.sha256(view[HEADER.size:]).digest() != digest:
+                raise KnowledgeFileError(f"{self.path}: checksum mismatch (truncated or corrupt)")
+            self.sections = {}
+            for i in range(count):
+                name, offset, length = SECTION.unpack_from(view, HEADER.size + SECTION.size * i)
+                if offset + length > len(view):
+                    raise KnowledgeFileError(f"{self.path}: section {name!r} out of bounds")
+                self.sections[name.rstrip(b"\0").decode()] = (offset, length)
+        finally:
+            view.release()
+        missing = [name for name in SECTIONS if name not in self.sections]
+        if missing:
+            raise KnowledgeFileError(f"{self.path}: missing tables {', '.join(missing)}")
+
+    def section(self, name):
+        offset, length = self.sections[name]
+        return memoryview(self._map)[offset:offset + length]
+
+    def tables(self):
+        names = StringTable(self.section("ingredient_names"))
+        levels = self.section("ingredient_levels")
+        advice_ids = self.section("ingredient_advice").cast("I")
+        if len(levels) != len(names) or len(advice_ids) != len(names):
+            raise KnowledgeFileError(f"{self.path}: ingredient sections disagree on the ingredient count")
+        tables = {name: json.loads(bytes(self.section(name))) for name in JSON_SECTIONS}
+        tables["ingredients"] = IngredientTable(names, levels, advice_ids, StringTable(self.section("advice")))
+        tables["products"] = StringPairs(StringTable(self.section("products")))
+        return tables
+
+    def close(self):
+        self._map.close()
+
+    def info(self):
+        return {"path": self.path, "version": self.version, "created": self.created,
+                "sections": {name: length for name, (_, length) in self.sections.items()}}
+
+
+def file_signature(st):
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class KnowledgeWatcher:
+    """Polls a knowledge file and calls ``on_load(KnowledgeFile)`` whenever it is replaced.
+
+    ``on_load`` runs on the watcher thread, so building new indexes never
+    blocks a request; it is expected to publish the result with a single
+    reference assignment. The file stays mapped while anything built from
+    it is referenced, so the old version is unmapped only after the last
+    request using it finishes. A file that fails to load is reported and
+    skipped until it changes again, and the current knowledge stays in use.
+    """
+
+    def __init__(self, path, on_load, interval=KNOWLEDGE_POLL_SECONDS, signature=None):
+        self.path = path
+        self.on_load = on_load
+        self.interval = interval
+        self.signature = signature
+        self.reloads = 0
+        self.errors = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        try:
+            signature = file_signature(os.stat(self.path))
+        except OSError:
+            return False
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        try:
+            self.on_load(KnowledgeFile(self.path))
+        except Exception as e:
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Knowledge reload from {self.path} failed: {self.last_error}")
+            return False
+        self.reloads += 1
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="knowledge-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {"path": self.path, "reloads": self.reloads, "errors": self.errors, "last_error": self.last_error}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NutriScan knowledge files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile the built-in tables (plus INGREDIENT_KNOWLEDGE_PATH and "
+                                              "PRODUCT_CATALOG_PATH overlays) into a knowledge file")
+    build.add_argument("output")
+    build.add_argument("--version", type=int, help="knowledge version (default: current Unix time)")
+    info = commands.add_parser("info", help="validate a knowledge file and print its header")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from app import builtin_tables
+
+        version = write_knowledge_file(args.output, builtin_tables(), args.version)
+        print(f"Wrote {args.output} (version {version})")
+    else:
+        kb = KnowledgeFile(args.path)
+        print(json.dumps(kb.info(), indent=2))
+        kb.close()
+
+
+if __name__ == "__main__":
+    main()
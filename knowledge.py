@@ -0,0 +1,181 @@
+import csv
+import json
+import re
+import sys
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+
+from matcher import KeywordMatcher
+
+
+LEVELS = ("risky", "moderate", "healthy", "unknown")
+LEVEL_CODES = {level: code for code, level in enumerate(LEVELS)}
+
+FREQUENCY = {
+    "risky": "Occasional (≤1 per week)",
+    "moderate": "1–3 servings/week",
+    "healthy": "Daily",
+    "unknown": "Unknown",
+}
+AMOUNT = {
+    "risky": "Max 1 serving when consumed",
+    "moderate": "1 serving",
+    "healthy": "1 serving (e.g., 1 cup/1 piece)",
+    "unknown": "Unknown",
+}
+GENERIC_ADVICE = {
+    "risky": (["Potential health risks with overconsumption"], "Limit consumption and check for healthier alternatives"),
+    "moderate": (["Provides nutrients but should be consumed in moderation"], "Consume as part of a balanced diet"),
+    "healthy": (["Provides essential nutrients and health benefits"], "Regular consumption recommended"),
+    "unknown": (["Insufficient data for specific recommendations"], "Consume mindfully and check for allergens"),
+}
+
+SEPARATOR = "\n"
+# What separates the items of an ingredient list: clean_and_deduplicate
+# splits on these, and product matches and NER windows never span one.
+DELIMITERS = re.compile(r"[\,\n;:\.]")
+ADVICE_CACHE_SIZE = 10_000
+
+# Ingredient knowledge flattened in priority order: ``names[i]`` has level
+# code ``levels[i]`` and advice ``advice[advice_ids[i]]``, a JSON-encoded
+# ``[level, effects, recommendation]``. Any sequences will do, including
+# views over a memory-mapped knowledge file.
+IngredientTable = namedtuple("IngredientTable", "names levels advice_ids advice")
+
+
+def advice_summary(level, frequency, amount, recommendation):
+    if level == "risky":
+        return f"Consider limiting to {frequency}. {amount}. {recommendation}"
+    if level == "moderate":
+        return f"Consume in moderation: {frequency}, typical amount: {amount}. {recommendation}"
+    if level == "healthy":
+        return f"Healthy choice: {frequency}. Typical serving: {amount}. {recommendation}"
+    return "No clear guidance — consume mindfully."
+
+
+def _intern_list(values):
+    return [sys.intern(str(v)) for v in values]
+
+
+def load_knowledge_file(path):
+    """Read ingredient knowledge from JSON or CSV into ``{name: {type, effects, recommendation}}``.
+
+    JSON may be a mapping shaped like ``INGREDIENT_KNOWLEDGE`` or a list of
+    objects with a ``name`` key. CSV needs ``name,type,effects,recommendation``
+    columns, with effects separated by ``|``.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return {
+                row["name"].strip().lower(): {
+                    "type": row["type"].strip().lower(),
+                    "effects": [e.strip() for e in (row.get("effects") or "").split("|") if e.strip()],
+                    "recommendation": (row.get("recommendation") or "").strip(),
+                }
+                for row in csv.DictReader(f)
+                if row.get("name")
+            }
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {item["name"]: item for item in data}
+    return {name.strip().lower(): info for name, info in data.items()}
+
+
+def compile_ingredients(knowledge, fallback_keywords):
+    """Flatten ``{name: {type, effects, recommendation}}`` plus the generic
+    ``{level: [names]}`` lists into an ``IngredientTable``; identical advice is stored once."""
+    names, levels, advice_ids, advice = [], array("B"), array("I"), {}
+
+    def add(name, level, effects, recommendation):
+        name = name.lower()
+        if level not in LEVEL_CODES:
+            raise ValueError(f"Unknown level {level!r} for ingredient {name!r}")
+        spec = json.dumps([level, _intern_list(effects), recommendation], separators=(",", ":"), ensure_ascii=False)
+        names.append(name)
+        levels.append(LEVEL_CODES[level])
+        advice_ids.append(advice.setdefault(spec, len(advice)))
+
+    for name, info in knowledge.items():
+        add(name, info.get("type", "unknown"), info.get("effects", []), info.get("recommendation", ""))
+    for level in ("risky", "moderate", "healthy"):
+        effects, recommendation = GENERIC_ADVICE[level]
+        for name in fallback_keywords.get(level, ()):
+            add(name, level, effects, recommendation)
+    return IngredientTable(names, levels, advice_ids, list(advice))
+
+
+def advice_payload(level, effects, recommendation):
+    frequency, amount = FREQUENCY[level], AMOUNT[level]
+    return {
+        "level": level,
+        "effects": _intern_list(effects),
+        "advice": {
+            "frequency": frequency,
+            "amount": amount,
+            "summary": advice_summary(level, frequency, amount, recommendation),
+            "recommendation": sys.intern(recommendation),
+        },
+    }
+
+
+class IngredientIndex:
+    """Compiled ingredient knowledge for consumption advice.
+
+    Ingredient names have dense ids in priority order (specific knowledge
+    first, then the generic risky/moderate/healthy keyword lists), and the
+    names, levels and advice ids are kept as the ``IngredientTable`` they
+    came in, so an index loaded from a knowledge file reads them from the
+    shared mapping. The only private structure is the automaton over the
+    names. Advice payloads are decoded on first use and memoized per advice
+    id, so identical generic advice is a single object. A whole ingredient
+    list is resolved with one automaton pass; when several names match an
+    ingredient the lowest id wins, matching the original first-match-in-order
+    scan.
+    """
+
+    def __init__(self, knowledge, fallback_keywords):
+        self._load(compile_ingredients(knowledge, fallback_keywords))
+
+    @classmethod
+    def from_table(cls, table):
+        index = cls.__new__(cls)
+        index._load(table)
+        return index
+
+    def _load(self, table):
+        self.names, self.levels, self.advice_ids, self.advice = table
+        self._matcher = KeywordMatcher()
+        for ingredient_id, name in enumerate(self.names):
+            self._matcher.add(name, ingredient_id)
+        self._matcher.build()
+        self.payload = lru_cache(maxsize=ADVICE_CACHE_SIZE)(self._payload)
+        self.unknown = advice_payload("unknown", *GENERIC_ADVICE["unknown"])
+
+    def _payload(self, advice_id):
+        return advice_payload(*json.loads(self.advice[advice_id]))
+
+    def __len__(self):
+        return len(self.names)
+
+    def match_ids(self, ingredients):
+        """Return the best-matching id (or -1) for each ingredient, in one pass."""
+        ingredients = [ing.lower() for ing in ingredients]
+        best = [-1] * len(ingredients)
+        if not ingredients:
+            return best
+        starts, offset = [], 0
+        for ing in ingredients:
+            starts.append(offset)
+            offset += len(ing) + len(SEPARATOR)
+        for ingredient_id, _, end in self._matcher.iter_matches(SEPARATOR.join(ingredients)):
+            i = bisect_right(starts, end - 1) - 1
+            if best[i] < 0 or ingredient_id < best[i]:
+                best[i] = ingredient_id
+        return best
+
+    def advise(self, ingredients):
+        """Return the shared advice payload for each ingredient (``self.unknown`` if none)."""
+        return [self.payload(self.advice_ids[i]) if i >= 0 else self.unknown for i in self.match_ids(ingredients)]
@@ -0,0 +1,86 @@
+from collections import deque
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over many tagged keywords.
+
+    Every keyword is added with a tag (any hashable, e.g. ``("risk", "sugar")``).
+    After ``build()``, a single left-to-right pass over a text reports every
+    keyword occurrence, including overlapping ones, in time linear in the
+    length of the text plus the number of hits, independent of how many
+    keywords were added.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._own = [[]]
+        self._out = [[]]
+        self._count = 0
+        self._built = False
+
+    def add(self, keyword: str, tag):
+        if not keyword:
+            return
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+                self._out.append([])
+            node = nxt
+        self._own[node].append((tag, keyword))
+        self._count += 1
+        self._built = False
+
+    def build(self):
+        goto, fail = self._goto, self._fail
+        queue = deque()
+        for nxt in goto[0].values():
+            fail[nxt] = 0
+            self._out[nxt] = list(self._own[nxt])
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                fail[nxt] = goto[state].get(ch, 0)
+                self._out[nxt] = self._own[nxt] + self._out[fail[nxt]]
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str):
+        """Yield ``(tag, keyword, end)`` for every occurrence in ``text``."""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for tag, keyword in out[node]:
+                yield tag, keyword, i + 1
+
+    def __len__(self):
+        return self._count
+
+
+def build_matcher(tables):
+    """Build one matcher from ``{category: iterable_of_keywords}``.
+
+    Tags are ``(category, keyword)`` pairs so callers can filter by category
+    and still know which keyword fired.
+    """
+    matcher = KeywordMatcher()
+    for category, keywords in tables.items():
+        for keyword in keywords:
+            matcher.add(keyword, (category, keyword))
+    return matcher.build()
@@ -0,0 +1,263 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from workers import env_int
+
+
+ALLOW_PROFILING = env_int("ALLOW_PROFILING", 0)
+PROFILE_TOP = env_int("PROFILE_TOP", 40)
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MEGAPIXEL_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 12.0, 24.0)
+
+# Stage timings of the current request, when it asked for a breakdown (None otherwise).
+request_timings = ContextVar("request_timings", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * len(self.buckets), 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][i] += 1
+                    break
+            counts[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in items:
+            labels = dict(zip(self.labelnames, key))
+            samples.extend(histogram_samples(self.name, labels, zip(self.buckets, counts), total))
+        return samples
+
+
+def histogram_samples(name, labels, bucket_counts, total):
+    """Prometheus samples for a histogram given per-bucket (non-cumulative) counts."""
+    samples, cumulative = [], 0
+    for bound, count in bucket_counts:
+        cumulative += count
+        samples.append((f"{name}_bucket", {**labels, "le": _format_value(float(bound))}, cumulative))
+    samples.append((f"{name}_sum", labels, total))
+    samples.append((f"{name}_count", labels, cumulative))
+    return samples
+
+
+class Registry:
+    """Metrics exposed at /metrics in the Prometheus text format.
+
+    Besides the counters, gauges and histograms created here, collectors are
+    called at scrape time and return ``(name, kind, help, samples)`` tuples;
+    they export numbers other components already keep (queue depth, cache
+    and batching stats) without instrumenting those components twice.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=STAGE_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        families = [(m.name, m.kind, m.help, m.samples()) for m in self._metrics]
+        for collect in self._collectors:
+            try:
+                families.extend(collect())
+            except Exception as e:
+                print(f"Metrics collector {collect.__name__} failed: {e}")
+        lines = []
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware counting requests and timing them to response start,
+    labelled by route template (``/results/{analysis_id}``) rather than raw path."""
+
+    def __init__(self, app, counter, seconds):
+        self.app = app
+        self.counter = counter
+        self.seconds = seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                self.seconds.observe(time.perf_counter() - started, route=self._route(scope))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.counter.inc(route=self._route(scope), status=status)
+
+    @staticmethod
+    def _route(scope):
+        route = scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+
+class StageError(Exception):
+    """A pipeline stage failed; carries the stage name so the API can say where."""
+
+    def __init__(self, stage, error, status_code=500):
+        super().__init__(stage, error, status_code)
+        self.stage = stage
+        self.error = error
+        self.status_code = status_code
+
+    def __str__(self):
+        return f"{self.stage} failed: {self.error}"
+
+    def detail(self):
+        return {"stage": self.stage, "error": type(self.error).__name__, "message": str(self.error)}
+
+
+class StageTimer:
+    """Times pipeline stages into a histogram and, when the request asked for
+    it, into its per-request breakdown. Exceptions escaping a stage are
+    counted and re-raised as StageError naming the stage."""
+
+    def __init__(self, registry):
+        self.seconds = registry.histogram("nutriscan_stage_seconds", "Time spent per pipeline stage.", ("stage",))
+        self.errors = registry.counter("nutriscan_stage_errors_total", "Failures per pipeline stage.", ("stage",))
+
+    def record(self, stage, seconds):
+        self.seconds.observe(seconds, stage=stage)
+        timings = request_timings.get()
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 2)
+
+    @contextmanager
+    def __call__(self, stage, passthrough=()):
+        started = time.perf_counter()
+        try:
+            yield
+        except StageError as e:
+            self.errors.inc(stage=e.stage)
+            raise
+        except passthrough:
+            raise
+        except Exception as e:
+            self.errors.inc(stage=stage)
+            raise StageError(stage, e) from e
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+
+def profile_call(mode, fn, *args):
+    """Run fn(*args) under a profiler; returns (result, report_text).
+
+    ``mode`` is "cprofile" or "pyinstrument" (when installed).
+    """
+    if mode == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            result = fn(*args)
+        finally:
+            profiler.stop()
+        return result, profiler.output_text(unicode=False, color=False)
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    return result, out.getvalue()
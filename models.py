@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+
+
+class LazyModel:
+    """A model that is loaded on a background thread the first time it is needed.
+
+    ``get()`` never blocks unless asked to: while the model is still loading
+    (or failed to load) it returns None and callers fall back to whatever they
+    can do without it.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = "pending"
+        self.error = None
+        self.load_seconds = None
+        self._value = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self.state != "pending":
+                return
+            self.state = "loading"
+        threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True).start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            value = self.loader()
+        except Exception as e:
+            print(f"Warning: {self.name} model could not be loaded:", e)
+            self.error = str(e)
+            self.state = "failed"
+        else:
+            self._value = value
+            self.state = "ready"
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        self._done.set()
+
+    def get(self, wait=False, timeout=None):
+        if self.state == "pending":
+            self.start()
+        if wait:
+            self._done.wait(timeout)
+        return self._value if self.state == "ready" else None
+
+    def status(self):
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+    def _reset_after_fork(self):
+        # The loading thread does not survive fork(); let the child load again on demand.
+        if self.state == "loading":
+            self.state = "pending"
+            self._lock = threading.Lock()
+            self._done = threading.Event()
+
+
+_registry = []
+
+
+def register(name, loader):
+    model = LazyModel(name, loader)
+    _registry.append(model)
+    return model
+
+
+def warm_up():
+    for model in _registry:
+        model.start()
+
+
+def statuses():
+    return {model.name: model.status() for model in _registry}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: [m._reset_after_fork() for m in _registry])
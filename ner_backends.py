@@ -0,0 +1,71 @@
+import os
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+NER_BACKEND = os.getenv("NER_BACKEND", "torch")
+NER_ONNX_DIR = os.getenv("NER_ONNX_DIR", os.path.join(os.path.expanduser("~"), ".cache", "nutriscan", "onnx"))
+
+
+def load_ner_pipeline(model_name, backend=NER_BACKEND):
+    """Build the token-classification pipeline on the chosen inference backend.
+
+    - ``torch``: the original full-precision PyTorch model.
+    - ``torch-int8``: the same model with its Linear layers dynamically
+      quantized to int8, roughly 4x smaller weights and faster on CPU.
+    - ``onnx``: the model exported to ONNX and run by onnxruntime (needs
+      ``optimum[onnxruntime]``); the export is cached under ``NER_ONNX_DIR``.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"NER_BACKEND must be one of {', '.join(BACKENDS)}, got {backend!r}")
+    from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == "onnx":
+        model = load_onnx_model(model_name)
+    else:
+        model = AutoModelForTokenClassification.from_pretrained(model_name)
+        model.eval()
+        if backend == "torch-int8":
+            import torch
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+
+
+def load_onnx_model(model_name):
+    try:
+        from optimum.onnxruntime import ORTModelForTokenClassification
+    except ImportError as e:
+        raise RuntimeError("NER_BACKEND=onnx requires 'optimum[onnxruntime]' to be installed") from e
+    export_dir = os.path.join(NER_ONNX_DIR, model_name.replace("/", "--"))
+    if os.path.exists(os.path.join(export_dir, "model.onnx")):
+        return ORTModelForTokenClassification.from_pretrained(export_dir)
+    model = ORTModelForTokenClassification.from_pretrained(model_name, export=True)
+    os.makedirs(export_dir, exist_ok=True)
+    model.save_pretrained(export_dir)
+    return model
+
+
+def entity_key(ent):
+    return (ent.get("entity_group"), (ent.get("word") or "").strip().lower(), ent.get("start"), ent.get("end"))
+
+
+def entity_parity(reference, candidate):
+    """Compare two lists of per-text entity lists; exact (group, word, span) matching."""
+    matched = expected = found = 0
+    max_score_delta = 0.0
+    for ref_ents, cand_ents in zip(reference, candidate):
+        ref = {entity_key(e): float(e.get("score", 0.0)) for e in ref_ents}
+        cand = {entity_key(e): float(e.get("score", 0.0)) for e in cand_ents}
+        expected += len(ref)
+        found += len(cand)
+        for key in ref.keys() & cand.keys():
+            matched += 1
+            max_score_delta = max(max_score_delta, abs(ref[key] - cand[key]))
+    precision = matched / found if found else 1.0
+    recall = matched / expected if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(f1, 4),
+        "max_score_delta": round(max_score_delta, 4),
+    }
@@ -0,0 +1,166 @@
+import re
+import threading
+
+from knowledge import DELIMITERS
+from workers import env_int
+
+NER_WINDOW_TOKENS = env_int("NER_WINDOW_TOKENS", 256)
+NER_WINDOW_OVERLAP = env_int("NER_WINDOW_OVERLAP", 32)
+NER_WINDOW_BATCH = env_int("NER_WINDOW_BATCH", 32)
+
+WORDS = re.compile(r"\S+\s*")
+# Token estimate when the pipeline has no tokenizer: words and punctuation marks.
+APPROX_TOKENS = re.compile(r"\w+|[^\w\s]")
+
+
+class NerChunker:
+    """Runs a token-classification pipeline over texts of any length.
+
+    Texts that fit in ``max_tokens`` go to the model whole, exactly as
+    before. Longer ones are cut at ingredient delimiters (a segment longer
+    than a window is cut between words instead). Segments are packed
+    greedily into windows of at most ``max_tokens`` tokens, as counted by the
+    pipeline's tokenizer. Each window repeats up to ``overlap`` tokens of
+    whole segments from the end of the previous one, so every entity is seen
+    whole with some context. All windows of a batch of texts run through the
+    model together. Entity offsets are shifted back to the full text, and an
+    entity found again in an overlap is kept once: the longer span, then the
+    higher score. Cost is linear in text length, and nothing past the 512
+    token limit is lost.
+    """
+
+    def __init__(self, max_tokens=NER_WINDOW_TOKENS, overlap=NER_WINDOW_OVERLAP, batch_size=NER_WINDOW_BATCH):
+        if not 0 <= overlap < max_tokens:
+            raise ValueError(f"NER_WINDOW_OVERLAP must be below NER_WINDOW_TOKENS, got {overlap} >= {max_tokens}")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self._texts = 0
+        self._chunked = 0
+        self._windows = 0
+        self._max_windows = 0
+
+    def __call__(self, ner_pipeline, texts):
+        """Raw pipeline entities for each text, offsets relative to that text."""
+        tokenizer = getattr(ner_pipeline, "tokenizer", None)
+        spans = [self.windows(text, tokenizer) for text in texts]
+        pieces = [text[start:end] for text, text_spans in zip(texts, spans) for start, end in text_spans]
+        results = ner_pipeline(pieces, batch_size=min(len(pieces), self.batch_size)) if pieces else []
+        out, i = [], 0
+        for text_spans in spans:
+            window_results = results[i:i + len(text_spans)]
+            i += len(text_spans)
+            out.append(window_results[0] if len(text_spans) == 1 else merge_entities(text_spans, window_results))
+        with self._lock:
+            self._texts += len(texts)
+            self._windows += len(pieces)
+            for text_spans in spans:
+                if len(text_spans) > 1:
+                    self._chunked += 1
+                    self._max_windows = max(self._max_windows, len(text_spans))
+        return out
+
+    def token_counts(self, tokenizer, pieces):
+        if tokenizer is None:
+            return [len(APPROX_TOKENS.findall(piece)) for piece in pieces]
+        return [len(ids) for ids in tokenizer(pieces, add_special_tokens=False)["input_ids"]]
+
+    def windows(self, text, tokenizer=None):
+        """(start, end) character spans of the windows covering ``text``."""
+        spans = segments(text)
+        if not spans:
+            return [(0, len(text))]
+        counts = self.token_counts(tokenizer, [text[start:end] for start, end in spans])
+        if sum(counts) <= self.max_tokens:
+            return [(0, len(text))]
+        spans, counts = self._split_long(text, spans, counts, tokenizer)
+        # Counts are per segment, so a window's real token count can differ by a
+        # few at the joins; the default window leaves ample room below 512.
+
+        windows, i = [], 0
+        while True:
+            j, total = i, 0
+            while j < len(spans) and (j == i or total + counts[j] <= self.max_tokens):
+                total += counts[j]
+                j += 1
+            windows.append((spans[i][0], spans[j - 1][1]))
+            if j == len(spans):
+                return windows
+            # Start the next window a few segments back, but always move forward.
+            k, back = j, 0
+            while k - 1 > i and back + counts[k - 1] <= self.overlap:
+                k -= 1
+                back += counts[k]
+            i = k
+
+    def _split_long(self, text, spans, counts, tokenizer):
+        out_spans, out_counts = [], []
+        for (start, end), count in zip(spans, counts):
+            if count <= self.max_tokens:
+                out_spans.append((start, end))
+                out_counts.append(count)
+                continue
+            words = [(m.start(), m.end()) for m in WORDS.finditer(text, start, end)]
+            if not words:
+                out_spans.append((start, end))
+                out_counts.append(count)
+                continue
+            words[0] = (start, words[0][1])
+            words[-1] = (words[-1][0], end)
+            out_spans.extend(words)
+            out_counts.extend(self.token_counts(tokenizer, [text[a:b] for a, b in words]))
+        return out_spans, out_counts
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window_tokens": self.max_tokens,
+                "overlap_tokens": self.overlap,
+                "texts": self._texts,
+                "chunked_texts": self._chunked,
+                "windows": self._windows,
+                "max_windows_per_text": self._max_windows,
+            }
+
+
+def segments(text):
+    """(start, end) spans of ``text`` split after each delimiter; together they cover the text."""
+    spans, start = [], 0
+    for m in DELIMITERS.finditer(text):
+        spans.append((start, m.end()))
+        start = m.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+
+def merge_entities(spans, window_results):
+    """Entities of all windows with offsets in the full text, overlap duplicates removed."""
+    shifted = []
+    for (offset, _), entities in zip(spans, window_results):
+        for ent in entities:
+            start, end = ent.get("start"), ent.get("end")
+            if start is not None and end is not None:
+                ent = {**ent, "start": start + offset, "end": end + offset}
+            shifted.append(ent)
+
+    merged, seen_words = [], set()
+    located = sorted((e for e in shifted if e.get("start") is not None and e.get("end") is not None),
+                     key=lambda e: (e["start"], -(e["end"] - e["start"])))
+    for ent in located:
+        last = merged[-1] if merged else None
+        if last is not None and ent["start"] < last["end"]:
+            # Overlapping spans can only come from two windows reading the same text.
+            if (ent["end"] - ent["start"], float(ent.get("score", 0))) > \
+                    (last["end"] - last["start"], float(last.get("score", 0))):
+                merged[-1] = ent
+            continue
+        merged.append(ent)
+    for ent in shifted:
+        if ent.get("start") is None or ent.get("end") is None:
+            key = (ent.get("entity_group"), (ent.get("word") or "").strip().lower())
+            if key not in seen_words:
+                seen_words.add(key)
+                merged.append(ent)
+    return merged
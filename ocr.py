@@ -0,0 +1,328 @@
+import io
+import math
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from tesseract_backends import image_to_data
+from workers import env_int
+
+
+OCR_ACCEPT_CONFIDENCE = env_int("OCR_ACCEPT_CONFIDENCE", 70)
+OCR_RETRY_CONFIDENCE = env_int("OCR_RETRY_CONFIDENCE", 40)
+OCR_LATENCY_BUDGET_MS = env_int("OCR_LATENCY_BUDGET_MS", 8000)
+REGION_PADDING = 12
+# Each image skipped as over budget shrinks the EasyOCR estimate, so a slow
+# measurement is re-probed after a few images instead of disabling EasyOCR.
+BUDGET_DECAY = 0.8
+
+OCR_MAX_SIDE = env_int("OCR_MAX_SIDE", 2000)
+OCR_ROI = env_int("OCR_ROI", 1)
+ROI_DETECT_SIDE = env_int("ROI_DETECT_SIDE", 900)
+ROI_ANCHORS = ("ingredient", "nutrition", "composition")
+ROI_MARGIN = 0.02
+ROI_MIN_FRACTION = 0.05
+
+MAX_IMAGE_PIXELS = env_int("MAX_IMAGE_PIXELS", 50_000_000)
+REDUCE_MODES = ("L", "RGB", "RGBA", "CMYK")
+# Keys of a trace's timings_ms that are OCR engine calls; the rest (decode,
+# roi) are other stages of reading a label.
+ENGINES = ("tesseract", "tesseract_region", "easyocr")
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def tesseract_words(image: Image.Image, config=""):
+    """Run Tesseract once and return (text, mean_confidence, bbox_of_words)."""
+    data = image_to_data(image, config=config)
+    lines, weighted, chars = {}, 0.0, 0
+    left = top = float("inf")
+    right = bottom = 0
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        conf = float(data["conf"][i])
+        if not word or conf < 0:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        weighted += conf * len(word)
+        chars += len(word)
+        left = min(left, data["left"][i])
+        top = min(top, data["top"][i])
+        right = max(right, data["left"][i] + data["width"][i])
+        bottom = max(bottom, data["top"][i] + data["height"][i])
+    text = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+    confidence = weighted / chars if chars else 0.0
+    bbox = (int(left), int(top), int(right), int(bottom)) if chars else None
+    return text, confidence, bbox
+
+
+def easyocr_words(reader, image):
+    """``image`` is a PIL image or an already preprocessed (grayscale) array."""
+    pixels = image if isinstance(image, np.ndarray) else np.asarray(image.convert("RGB"))
+    results = reader.readtext(pixels)
+    text = " ".join(res[1] for res in results)
+    confidence = 100.0 * sum(float(res[2]) for res in results) / len(results) if results else 0.0
+    return text, confidence
+
+
+class OcrRouter:
+    """Decides per image whether Tesseract's output is good enough.
+
+    Tesseract runs first. Its length-weighted word confidence decides the next
+    step: accept it, re-read just the text region (cropped and upscaled) when
+    confidence is middling, or escalate to EasyOCR when it is poor or empty.
+    EasyOCR only runs if ``get_easyocr()`` returns a loaded reader and its
+    expected cost still fits in the latency budget. The first (cold) EasyOCR
+    call does not count towards that estimate, and the estimate decays while
+    EasyOCR is being skipped, so a slow spell is re-probed rather than
+    disabling it. ``route`` returns the text plus a trace of what was done,
+    which callers feed into ``OcrStats`` (possibly in another process).
+    The trace's ``degraded`` is true when Tesseract's text was not good
+    enough but EasyOCR was skipped (still loading, or over budget), so the
+    text is a stopgap that should not be cached as final.
+    """
+
+    def __init__(self, accept_confidence=OCR_ACCEPT_CONFIDENCE, retry_confidence=OCR_RETRY_CONFIDENCE,
+                 latency_budget_ms=OCR_LATENCY_BUDGET_MS):
+        self.accept_confidence = accept_confidence
+        self.retry_confidence = retry_confidence
+        self.latency_budget_ms = latency_budget_ms
+        self._easyocr_ms = None
+        self._easyocr_warm = False
+
+    def route(self, image, preprocessed: Image.Image, get_easyocr=None):
+        started = time.perf_counter()
+        timings = {}
+
+        t = time.perf_counter()
+        text, confidence, bbox = tesseract_words(preprocessed)
+        timings["tesseract"] = (time.perf_counter() - t) * 1000
+        engine, decision = "tesseract", "accept"
+        degraded = False
+
+        if text and confidence < self.accept_confidence and confidence >= self.retry_confidence and bbox:
+            decision = "region_retry"
+            t = time.perf_counter()
+            region = self._text_region(preprocessed, bbox)
+            retry_text, retry_conf, _ = tesseract_words(region, config="--psm 6")
+            timings["tesseract_region"] = (time.perf_counter() - t) * 1000
+            if retry_text and retry_conf > confidence:
+                text, confidence = retry_text, retry_conf
+
+        if not text or confidence < self.accept_confidence:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            easyocr_reader = get_easyocr() if get_easyocr else None
+            if easyocr_reader is None:
+                decision = "easyocr_unavailable" if decision == "accept" else decision
+                degraded = True
+            elif self._easyocr_ms is not None and elapsed_ms + self._easyocr_ms > self.latency_budget_ms:
+                decision = "over_budget"
+                degraded = True
+                self._easyocr_ms *= BUDGET_DECAY
+            else:
+                t = time.perf_counter()
+                easy_text, easy_conf = easyocr_words(easyocr_reader, image)
+                timings["easyocr"] = (time.perf_counter() - t) * 1000
+                if not self._easyocr_warm:
+                    self._easyocr_warm = True
+                elif self._easyocr_ms is None:
+                    self._easyocr_ms = timings["easyocr"]
+                else:
+                    self._easyocr_ms = 0.8 * self._easyocr_ms + 0.2 * timings["easyocr"]
+                decision = "escalate"
+                if easy_text and (not text or easy_conf > confidence):
+                    text, confidence, engine = easy_text, easy_conf, "easyocr"
+
+        trace = {
+            "engine": engine,
+            "decision": decision,
+            "confidence": round(confidence, 1),
+            "timings_ms": {k: round(v, 2) for k, v in timings.items()},
+            "degraded": degraded,
+        }
+        return text.strip(), trace
+
+    @staticmethod
+    def _text_region(image, bbox):
+        left, top, right, bottom = bbox
+        box = (max(0, left - REGION_PADDING), max(0, top - REGION_PADDING),
+               min(image.width, right + REGION_PADDING), min(image.height, bottom + REGION_PADDING))
+        region = image.crop(box)
+        return region.resize((region.width * 2, region.height * 2), Image.LANCZOS)
+
+
+def normalize_resolution(image: Image.Image, max_side=OCR_MAX_SIDE) -> Image.Image:
+    """Downscale so the longest side is at most ``max_side`` pixels.
+
+    Label text on a 12 MP phone photo is far larger than Tesseract needs
+    (~30 px cap height); OCR time and memory grow with pixel count.
+    """
+    longest = max(image.size)
+    if max_side <= 0 or longest <= max_side:
+        return image
+    factor = longest / max_side
+    if factor >= 2:
+        if image.mode not in REDUCE_MODES:
+            # Image.reduce() rejects palette, 1-bit and 16/32-bit modes.
+            image = image.convert("L" if image.mode in ("1", "LA", "I", "F") or image.mode.startswith("I;") else "RGB")
+        image = image.reduce(int(factor))
+        factor = max(image.size) / max_side
+    if factor > 1:
+        image = image.resize((round(image.width / factor), round(image.height / factor)), Image.BILINEAR)
+    return image
+
+
+def open_image(data: bytes, max_side=OCR_MAX_SIDE, max_pixels=MAX_IMAGE_PIXELS) -> Image.Image:
+    """Decode an upload with bounded memory.
+
+    The pixel count comes from the header and is checked before any pixel
+    data is decoded. JPEGs are decoded in draft mode, which lets libjpeg
+    scale by 1/2, 1/4 or 1/8 while decoding, down to no smaller than what
+    ``normalize_resolution`` will keep, so the full-size bitmap of a large
+    photo is never materialized.
+    """
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    if max_pixels > 0 and width * height > max_pixels:
+        raise ImageTooLarge(f"image is {width}x{height} pixels; the limit is {max_pixels} pixels")
+    image.info["original_size"] = (width, height)
+    longest = max(width, height)
+    if image.format == "JPEG" and max_side > 0 and longest > max_side:
+        scale = max_side / longest
+        image.draft(None, (math.ceil(width * scale), math.ceil(height * scale)))
+    image.load()
+    return image
+
+
+def find_label_regions(image: Image.Image, detect_side=ROI_DETECT_SIDE):
+    """Locate the ingredients / nutrition panels; returns (boxes in ``image`` coordinates, overview text).
+
+    A sparse Tesseract pass on a small grayscale thumbnail finds anchor words
+    such as "Ingredients" or "Nutrition"; each panel spans from its anchor down
+    to the next anchor (or the bottom of the image) across the width covered by
+    the anchor's text block. The boxes are empty when no anchor is found. The
+    overview text is every word the pass read, one text block per line; it
+    covers the whole pack (brand names included), not just the panels.
+    """
+    thumb = image.convert("L")
+    scale = 1.0
+    if max(thumb.size) > detect_side:
+        scale = max(thumb.size) / detect_side
+        thumb = thumb.resize((round(thumb.width / scale), round(thumb.height / scale)), Image.BILINEAR)
+    data = image_to_data(thumb, config="--psm 11")
+
+    blocks, anchors, lines = {}, [], {}
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        if not word or float(data["conf"][i]) < 0:
+            continue
+        lines.setdefault(data["block_num"][i], []).append(word)
+        word = word.lower()
+        box = (data["left"][i], data["top"][i], data["left"][i] + data["width"][i], data["top"][i] + data["height"][i])
+        block = blocks.setdefault(data["block_num"][i], list(box))
+        block[0], block[1] = min(block[0], box[0]), min(block[1], box[1])
+        block[2], block[3] = max(block[2], box[2]), max(block[3], box[3])
+        if word.startswith(ROI_ANCHORS):
+            anchors.append((box[1], data["block_num"][i]))
+    overview = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+    if not anchors:
+        return [], overview
+
+    anchors.sort()
+    width, height = thumb.size
+    margin_x, margin_y = int(width * ROI_MARGIN), int(height * ROI_MARGIN)
+    regions, covered = [], -1
+    for n, (top, block_num) in enumerate(anchors):
+        if top < covered:
+            continue
+        bottom = anchors[n + 1][0] if n + 1 < len(anchors) else height
+        left, right = blocks[block_num][0], blocks[block_num][2]
+        for other in blocks.values():
+            if other[1] >= top and other[3] <= bottom:
+                left, right = min(left, other[0]), max(right, other[2])
+        covered = bottom
+        box = (max(0, left - margin_x), max(0, top - margin_y), min(width, right + margin_x), min(height, bottom + margin_y))
+        if (box[2] - box[0]) * (box[3] - box[1]) >= ROI_MIN_FRACTION * width * height:
+            regions.append(box)
+    return [tuple(round(v * scale) for v in box) for box in regions], overview
+
+
+def merge_traces(traces, extra_timings):
+    timings = dict(extra_timings)
+    for trace in traces:
+        for engine, ms in trace["timings_ms"].items():
+            timings[engine] = round(timings.get(engine, 0.0) + ms, 2)
+    engines = {trace["engine"] for trace in traces}
+    return {
+        "engine": engines.pop() if len(engines) == 1 else "mixed",
+        "decision": traces[0]["decision"] if len(traces) == 1 else "regions",
+        "confidence": round(min(trace["confidence"] for trace in traces), 1),
+        "timings_ms": timings,
+        "degraded": any(trace.get("degraded") for trace in traces),
+        "regions": len(traces),
+    }
+
+
+class OcrStats:
+    """Aggregates router traces: per-engine calls and time, decisions and wins.
+
+    Timings of other stages in the trace (decode, roi) are kept apart from
+    the engines, so they never show up as engine calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.engine_calls = {}
+        self.engine_ms = {}
+        self.stage_calls = {}
+        self.stage_ms = {}
+        self.decisions = {}
+        self.winners = {}
+        self.confidence_sum = {}
+        self.images = 0
+
+    def record(self, trace):
+        with self._lock:
+            self.images += 1
+            for name, ms in trace["timings_ms"].items():
+                calls, total = (self.engine_calls, self.engine_ms) if name in ENGINES else \
+                    (self.stage_calls, self.stage_ms)
+                calls[name] = calls.get(name, 0) + 1
+                total[name] = total.get(name, 0.0) + ms
+            self.decisions[trace["decision"]] = self.decisions.get(trace["decision"], 0) + 1
+            winner = trace["engine"]
+            self.winners[winner] = self.winners.get(winner, 0) + 1
+            self.confidence_sum[winner] = self.confidence_sum.get(winner, 0.0) + trace["confidence"]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "images": self.images,
+                "engines": {
+                    engine: {
+                        "calls": calls,
+                        "avg_ms": round(self.engine_ms[engine] / calls, 2),
+                    }
+                    for engine, calls in self.engine_calls.items()
+                },
+                "stages": {
+                    stage: {
+                        "calls": calls,
+                        "avg_ms": round(self.stage_ms[stage] / calls, 2),
+                    }
+                    for stage, calls in self.stage_calls.items()
+                },
+                "decisions": dict(self.decisions),
+                "results_by_engine": {
+                    engine: {
+                        "count": count,
+                        "avg_confidence": round(self.confidence_sum[engine] / count, 1),
+                    }
+                    for engine, count in self.winners.items()
+                },
+            }
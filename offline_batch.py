@@ -0,0 +1,274 @@
+"""Analyze a directory (or manifest) of label images without the HTTP server.
+
+    python offline_batch.py photos/ --output results.jsonl --workers 8 --diet Vegan --allergies milk
+    python offline_batch.py manifest.txt --output results.parquet
+
+The input is a directory, searched recursively for images, or a manifest:
+a text file with one path per line, or a CSV with a ``path`` column. Paths
+in a manifest are relative to the manifest's directory.
+
+The run is a chain of generators. Paths are produced lazily, and finished
+ones are skipped. Decoding and OCR (``extract_text_traced``) run in a process pool
+with a bounded number of images in flight. NER runs in this process, in
+batches. ``analyze_text`` scores each label for the one profile given on
+the command line. Records are written as they complete, so memory stays
+flat however large the archive is.
+
+The output doubles as the checkpoint. JSONL is flushed record by record.
+Parquet goes to a directory of part files, each renamed into place when
+complete. A rerun with the same --output reads the paths already written
+and processes only the rest. A crash loses at most the records not yet
+flushed: one line of JSONL, or one part of Parquet.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import app
+from cache import content_hash
+from metrics import StageError
+
+PARQUET_COLUMNS = ("path", "status", "label_id", "detected_product", "health_score", "verdict", "stage", "error",
+                   "result")
+
+
+def iter_inputs(source):
+    """Image paths under a directory (sorted, recursive), or listed in a manifest."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(app.IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name)
+        return
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline="", encoding="utf-8") as f:
+        if source.lower().endswith(".csv"):
+            paths = (row["path"] for row in csv.DictReader(f))
+        else:
+            paths = (line.strip() for line in f)
+        for path in paths:
+            if path and not path.startswith("#"):
+                yield os.path.join(base, path)
+
+
+def init_worker():
+    # Offline runs should not race the EasyOCR fallback's background load.
+    app.easyocr_model.get(wait=True)
+
+
+def ocr_file(path):
+    """Runs in a pool process: (path, label_id, text, overview text, error)."""
+    try:
+        with open(path, "rb") as f:
+            contents = f.read()
+        label_id = content_hash(contents)
+        text, trace = app.extract_text_traced(app.decode_image(contents))
+        return path, label_id, text, trace.get("overview_text", ""), None
+    except StageError as e:
+        return path, None, None, None, {"status": e.status_code, "stage": e.stage, "error": str(e)}
+    except OSError as e:
+        return path, None, None, None, {"status": 404, "stage": "read", "error": str(e)}
+    except Exception as e:
+        return path, None, None, None, {"status": 500, "stage": "ocr", "error": str(e)}
+
+
+def ocr_results(paths, pool, in_flight):
+    """OCR results in completion order, with at most ``in_flight`` images submitted at once."""
+    pending = set()
+    for path in paths:
+        pending.add(pool.submit(ocr_file, path))
+        if len(pending) >= in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def analyzed(ocr_items, user_profile, ner_batch_size):
+    """Output records, running NER over ``ner_batch_size`` labels at a time."""
+    batch = []
+    for item in ocr_items:
+        batch.append(item)
+        if len(batch) >= ner_batch_size:
+            yield from analyze_batch(batch, user_profile)
+            batch = []
+    if batch:
+        yield from analyze_batch(batch, user_profile)
+
+
+def analyze_batch(batch, user_profile):
+    texts = [text for _, _, text, _, error in batch if error is None and text]
+    entities = iter(app.run_ner_batch(texts) if texts else [])
+    for path, label_id, text, overview, error in batch:
+        if error is not None:
+            yield {"path": path, **error}
+        elif not text:
+            yield {"path": path, "status": 400, "label_id": label_id, "stage": "ocr", "error": "No text found in image"}
+        else:
+            analysis = app.analyze_text(text, user_profile, next(entities) or [], overview)
+            analysis["label_id"] = label_id
+            yield {"path": path, "status": 200, "label_id": label_id, "result": analysis}
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def finished_paths(self):
+        """Paths already written; a torn last line from a crash is cut off."""
+        if not os.path.exists(self.path):
+            return set()
+        done, good_bytes = set(), 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    done.add(json.loads(line)["path"])
+                except (ValueError, KeyError):
+                    break
+                good_bytes += len(line)
+        if good_bytes < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good_bytes)
+        return done
+
+    def write(self, record):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class ParquetWriter:
+    """Part files ``part-NNNNN.parquet`` under the output directory, ``part_size`` records each."""
+
+    def __init__(self, directory, part_size):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("Parquet output requires pyarrow: pip install pyarrow") from e
+        self.directory = directory
+        self.part_size = part_size
+        self._rows = []
+        os.makedirs(directory, exist_ok=True)
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.directory, "part-*.parquet")))
+
+    def finished_paths(self):
+        import pyarrow.parquet as pq
+
+        for tmp in glob.glob(os.path.join(self.directory, "*.tmp")):
+            os.remove(tmp)
+        done = set()
+        for part in self._parts():
+            done.update(pq.read_table(part, columns=["path"]).column("path").to_pylist())
+        return done
+
+    def write(self, record):
+        result = record.get("result") or {}
+        self._rows.append({
+            "path": record["path"],
+            "status": record["status"],
+            "label_id": record.get("label_id"),
+            "detected_product": result.get("detected_product"),
+            "health_score": result.get("analysis", {}).get("health_score", {}).get("score"),
+            "verdict": result.get("analysis", {}).get("verdict"),
+            "stage": record.get("stage"),
+            "error": record.get("error"),
+            "result": json.dumps(result) if result else None,
+        })
+        if len(self._rows) >= self.part_size:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        parts = self._parts()
+        number = int(os.path.basename(parts[-1])[5:10]) + 1 if parts else 0
+        path = os.path.join(self.directory, f"part-{number:05d}.parquet")
+        table = pa.Table.from_pydict({column: [row[column] for row in self._rows] for column in PARQUET_COLUMNS})
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+
+
+def open_writer(output, output_format, part_size):
+    if output_format is None:
+        output_format = "parquet" if output.lower().endswith(".parquet") else "jsonl"
+    if output_format == "parquet":
+        return ParquetWriter(output, part_size)
+    return JsonlWriter(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NutriScan offline batch analysis")
+    parser.add_argument("source", help="directory of images, or a manifest (.txt or .csv with a path column)")
+    parser.add_argument("--output", required=True, help="results file (.jsonl) or directory (.parquet)")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), help="default: from the --output suffix")
+    parser.add_argument("--workers", type=int, default=app.pools.ocr_workers, help="OCR processes (default: OCR_WORKERS)")
+    parser.add_argument("--in-flight", type=int, help="images submitted to the pool at once (default: 4 x workers)")
+    parser.add_argument("--ner-batch", type=int, default=8, help="labels per NER batch")
+    parser.add_argument("--part-size", type=int, default=1000, help="records per Parquet part file")
+    parser.add_argument("--gender", default="Unspecified")
+    parser.add_argument("--age", type=int, default=30)
+    parser.add_argument("--weight", type=float, default=65.0)
+    parser.add_argument("--height", type=float, default=165.0)
+    parser.add_argument("--diet", default="No restrictions")
+    parser.add_argument("--allergies", default="", help="comma-separated")
+    args = parser.parse_args()
+
+    user_profile = app.build_user_profile(args.gender, args.age, args.weight, args.height, args.diet, args.allergies)
+    writer = open_writer(args.output, args.format, args.part_size)
+    done = writer.finished_paths()
+    if done:
+        print(f"Resuming: {len(done)} images already in {args.output}", file=sys.stderr)
+    paths = (path for path in iter_inputs(args.source) if path not in done)
+
+    # Start the OCR processes before this one loads the NER model, so forked
+    # workers do not inherit a copy of it (or torch's threads).
+    pool = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker)
+    pool.submit(int).result()
+    app.ner_model.get(wait=True)
+
+    started, count, failed = time.perf_counter(), 0, 0
+    try:
+        records = analyzed(ocr_results(paths, pool, args.in_flight or 4 * args.workers), user_profile, args.ner_batch)
+        for record in records:
+            writer.write(record)
+            count += 1
+            failed += record["status"] != 200
+            if count % 100 == 0:
+                rate = count / (time.perf_counter() - started)
+                print(f"{count} images ({failed} failed), {rate:.1f} images/s", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume", file=sys.stderr)
+    finally:
+        writer.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+    print(f"Done: {count} images ({failed} failed) in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
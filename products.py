@@ -0,0 +1,199 @@
+import csv
+import json
+import re
+from array import array
+from functools import lru_cache
+
+from knowledge import DELIMITERS
+
+CORRECTION_CACHE_SIZE = 50_000
+
+# Characters OCR commonly reads in place of letters; applied only inside
+# tokens that are mostly letters ("0reo" -> "oreo", but not "70g").
+OCR_CONFUSIONS = str.maketrans({"0": "o", "1": "l", "3": "e", "4": "a", "5": "s", "8": "b",
+                                "|": "l", "@": "a", "$": "s"})
+TOKEN_RE = re.compile(r"[\w|@$]+")
+
+
+def normalize_tokens(text):
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        token = token.replace("_", "")
+        if not token.isalpha() and sum(c.isalpha() for c in token) >= 2:
+            token = token.translate(OCR_CONFUSIONS)
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+def trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(token):
+    """Edits tolerated in a label token of this length; short tokens must match exactly."""
+    if len(token) >= 9:
+        return 2
+    if len(token) >= 5:
+        return 1
+    return 0
+
+
+def bounded_distance(a, b, k):
+    """Levenshtein distance of a and b, or k + 1 as soon as it must exceed k."""
+    if abs(len(a) - len(b)) > k:
+        return k + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > k:
+            return k + 1
+        prev = cur
+    return prev[-1]
+
+
+def load_catalog_file(path):
+    """Read ``[(alias, display_name)]`` from CSV or JSON.
+
+    CSV needs a ``name`` column and may have ``aliases`` (separated by ``|``).
+    JSON may be a mapping ``{alias: display_name}`` or a list of objects with
+    ``name`` and optional ``aliases``. A product's name is always one of its aliases.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            items = [{"name": row["name"], "aliases": (row.get("aliases") or "").split("|")}
+                     for row in csv.DictReader(f) if row.get("name")]
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return [(alias, name) for alias, name in data.items()]
+        items = data
+    entries = []
+    for item in items:
+        name = item["name"].strip()
+        entries.append((name, name))
+        entries.extend((alias, name) for alias in item.get("aliases") or () if alias.strip())
+    return entries
+
+
+class ProductCatalog:
+    """Brand/product names compiled for fuzzy lookup in OCR text.
+
+    Aliases are tokenized the same way as label text. Each label token is
+    corrected once against the catalog vocabulary: an exact hit, or the
+    closest vocabulary token within a length-dependent edit budget, found
+    through a trigram inverted index and verified with a bounded Levenshtein
+    distance. Corrections are memoized, so after warm-up a label costs a few
+    dictionary lookups per token. Aliases are then matched as token
+    sequences; a space-free variant of every multi-word alias also matches
+    ("cocacola", "parleg"), and adjacent label tokens are joined to match a
+    one-word alias ("kit kat" -> "kitkat"). Matches stay within one
+    delimited segment of the label, and a multi-word alias needs at least
+    one token read exactly, so "cocoa, cola nut" is not "Coca Cola". The
+    best match has the fewest edits, then comes first in the catalog.
+
+    ``entries`` is kept rather than copied (it may be a view over a mapped
+    knowledge file): each alias only records the index of its entry, and
+    the display name is read back when a match is returned.
+    """
+
+    def __init__(self, entries):
+        self._entries = entries
+        self._alias_entries = array("I")
+        self._phrases = {}
+        self._vocab = {}
+        self._grams = {}
+        seen = {}
+        for entry_id, (alias, _) in enumerate(entries):
+            tokens = tuple(normalize_tokens(alias))
+            if not tokens:
+                continue
+            variants = [tokens] + ([("".join(tokens),)] if len(tokens) > 1 else [])
+            for variant in variants:
+                if variant in seen:
+                    # A later entry for the same alias only replaces the display name.
+                    self._alias_entries[seen[variant]] = entry_id
+                    continue
+                seen[variant] = alias_id = len(self._alias_entries)
+                self._alias_entries.append(entry_id)
+                self._phrases.setdefault(variant[0], []).append((variant, alias_id))
+                for token in variant:
+                    self._add_token(token)
+        self._vocab_list = list(self._vocab)
+        self._grams = {gram: array("I", ids) for gram, ids in self._grams.items()}
+        self.correct = lru_cache(maxsize=CORRECTION_CACHE_SIZE)(self._correct)
+
+    def _add_token(self, token):
+        if token in self._vocab:
+            return
+        token_id = self._vocab[token] = len(self._vocab)
+        if len(token) >= 3:
+            for gram in trigrams(token):
+                self._grams.setdefault(gram, []).append(token_id)
+
+    def __len__(self):
+        return len(self._alias_entries)
+
+    def _correct(self, token):
+        """(vocabulary token, edits) for a label token, or (token, 0) when nothing is close."""
+        if token in self._vocab:
+            return token, 0
+        k = max_edits(token)
+        if not k:
+            return token, 0
+        grams = trigrams(token)
+        counts = {}
+        for gram in grams:
+            for token_id in self._grams.get(gram, ()):
+                counts[token_id] = counts.get(token_id, 0) + 1
+        # One edit changes at most three trigrams.
+        needed = len(grams) - 3 * k
+        best = None
+        for token_id, count in counts.items():
+            if count < needed:
+                continue
+            candidate = self._vocab_list[token_id]
+            distance = bounded_distance(token, candidate, k)
+            if distance <= k and (best is None or (distance, token_id) < best):
+                best = (distance, token_id)
+        if best is None:
+            return token, 0
+        return self._vocab_list[best[1]], best[0]
+
+    def match(self, text):
+        """Display name of the best catalog match in ``text``, or None."""
+        best = None
+        for segment in DELIMITERS.split(text):
+            raw = normalize_tokens(segment)
+            corrected = [self.correct(token) for token in raw]
+            words = [word for word, _ in corrected]
+            for i in range(len(words)):
+                # (alias head, label tokens it covers, edits)
+                heads = [(words[i], 1, corrected[i][1])]
+                if i + 1 < len(raw) and raw[i] + raw[i + 1] in self._phrases:
+                    heads.append((raw[i] + raw[i + 1], 2, 0))
+                for head, used, edits in heads:
+                    for phrase, alias_id in self._phrases.get(head, ()):
+                        end = i + used + len(phrase) - 1
+                        if tuple(words[i + used:end]) != phrase[1:]:
+                            continue
+                        token_edits = [edits] + [d for _, d in corrected[i + used:end]]
+                        if len(token_edits) > 1 and min(token_edits) > 0:
+                            continue
+                        key = (sum(token_edits), alias_id)
+                        if best is None or key < best:
+                            best = key
+        return self._entries[self._alias_entries[best[1]]][1] if best else None
+
+    def stats(self):
+        info = self.correct.cache_info()
+        return {
+            "aliases": len(self._alias_entries),
+            "vocabulary": len(self._vocab),
+            "trigrams": len(self._grams),
+            "correction_cache": {"size": info.currsize, "hits": info.hits, "misses": info.misses},
+        }
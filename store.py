@@ -0,0 +1,155 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from workers import env_int
+
+
+RESULT_STORE_SIZE = env_int("RESULT_STORE_SIZE", 1000)
+RESULT_STORE_MAX_BYTES = env_int("RESULT_STORE_MAX_BYTES", 64 * 1024 * 1024)
+RESULT_STORE_BATCH_SIZE = env_int("RESULT_STORE_BATCH_SIZE", 1000)
+RESULT_STORE_BATCH_MAX_BYTES = env_int("RESULT_STORE_BATCH_MAX_BYTES", 64 * 1024 * 1024)
+RESULT_STORE_TTL = env_int("RESULT_STORE_TTL", 3600)
+RESULT_STORE_URL = os.getenv("RESULT_STORE_URL", "")
+PURGE_EVERY = 100
+
+
+class ResultStore:
+    """Analysis results keyed by a generated analysis ID.
+
+    Results are kept as serialized JSON in an in-process LRU bounded by entry
+    count, total bytes and TTL. Results put with ``batch=True`` go to a
+    second LRU with its own bounds, so a large batch upload cannot evict
+    the results of interactive requests. When ``url`` is set (any SQLAlchemy URL, e.g.
+    ``sqlite:////var/lib/nutriscan/results.db``) results are also written to a
+    shared table so any worker can serve ``GET /results/{id}``. ``aput`` /
+    ``aget_json`` run the database round trips in a worker thread instead of
+    on the event loop.
+    """
+
+    def __init__(self, max_entries=RESULT_STORE_SIZE, max_bytes=RESULT_STORE_MAX_BYTES,
+                 ttl=RESULT_STORE_TTL, url=RESULT_STORE_URL,
+                 batch_max_entries=RESULT_STORE_BATCH_SIZE, batch_max_bytes=RESULT_STORE_BATCH_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._memory = _Lru(max_entries, max_bytes)
+        self._batch = _Lru(batch_max_entries, batch_max_bytes)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._engine = self._table = None
+        if url:
+            self._connect(url)
+
+    def _connect(self, url):
+        from sqlalchemy import Column, Float, MetaData, String, Table, Text, create_engine
+
+        metadata = MetaData()
+        self._table = Table(
+            "analysis_results", metadata,
+            Column("id", String(32), primary_key=True),
+            Column("expires_at", Float, nullable=False, index=True),
+            Column("payload", Text, nullable=False),
+        )
+        self._engine = create_engine(url, pool_pre_ping=True)
+        metadata.create_all(self._engine)
+
+    def put(self, analysis, batch=False) -> str:
+        analysis_id = uuid.uuid4().hex
+        analysis["analysis_id"] = analysis_id
+        payload = json.dumps(analysis)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            (self._batch if batch else self._memory).remember(analysis_id, expires_at, payload)
+            self._puts += 1
+            purge = self._puts % PURGE_EVERY == 0
+        if self._engine is not None:
+            with self._engine.begin() as conn:
+                conn.execute(self._table.insert().values(id=analysis_id, expires_at=expires_at, payload=payload))
+                if purge:
+                    conn.execute(self._table.delete().where(self._table.c.expires_at < time.time()))
+        return analysis_id
+
+    async def aput(self, analysis, batch=False) -> str:
+        if self._engine is None:
+            return self.put(analysis, batch)
+        return await asyncio.to_thread(self.put, analysis, batch)
+
+    async def aget_json(self, analysis_id):
+        now = time.time()
+        payload = self._memory_get(analysis_id, now)
+        if payload is not None or self._engine is None:
+            return payload
+        return await asyncio.to_thread(self._db_get, analysis_id, now)
+
+    def _memory_get(self, analysis_id, now):
+        with self._lock:
+            payload = self._memory.get(analysis_id, now)
+            return payload if payload is not None else self._batch.get(analysis_id, now)
+
+    def _db_get(self, analysis_id, now):
+        table = self._table
+        with self._engine.connect() as conn:
+            row = conn.execute(
+                table.select().where(table.c.id == analysis_id, table.c.expires_at >= now)
+            ).first()
+        if row is None:
+            return None
+        with self._lock:
+            self._memory.remember(analysis_id, row.expires_at, row.payload)
+        return row.payload
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._memory.entries),
+                "bytes": self._memory.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "batch": {
+                    "entries": len(self._batch.entries),
+                    "bytes": self._batch.bytes,
+                    "max_entries": self._batch.max_entries,
+                    "max_bytes": self._batch.max_bytes,
+                },
+                "ttl_seconds": self.ttl,
+                "shared_backend": self._engine is not None,
+            }
+
+
+class _Lru:
+    """Serialized results by ID, oldest evicted first; callers hold the store's lock."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+    def get(self, analysis_id, now):
+        entry = self.entries.get(analysis_id)
+        if entry is not None:
+            if entry[0] >= now:
+                self.entries.move_to_end(analysis_id)
+                return entry[2]
+            self.forget(analysis_id)
+        return None
+
+    def remember(self, analysis_id, expires_at, payload):
+        if analysis_id in self.entries:
+            self.forget(analysis_id)
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self.entries[analysis_id] = (expires_at, size, payload)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self.forget(next(iter(self.entries)))
+
+    def forget(self, analysis_id):
+        _, size, _ = self.entries.pop(analysis_id)
+        self.bytes -= size
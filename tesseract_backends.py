@@ -0,0 +1,91 @@
+import os
+import shlex
+import threading
+
+import pytesseract
+
+BACKENDS = ("auto", "tesserocr", "pytesseract")
+TESSERACT_BACKEND = os.getenv("TESSERACT_BACKEND", "auto")
+TESSERACT_LANG = os.getenv("TESSERACT_LANG", "eng")
+
+TSV_COLUMNS = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+               "left", "top", "width", "height", "conf", "text")
+
+if TESSERACT_BACKEND not in BACKENDS:
+    raise ValueError(f"TESSERACT_BACKEND must be one of {', '.join(BACKENDS)}, got {TESSERACT_BACKEND!r}")
+
+_local = threading.local()
+_fallback_reason = None
+
+
+def parse_psm(config):
+    """The page segmentation mode of a ``--psm N`` config; False if the config has other options."""
+    args = shlex.split(config or "")
+    if not args:
+        return None
+    if len(args) == 2 and args[0] == "--psm" and args[1].isdigit():
+        return int(args[1])
+    return False
+
+
+def _engine():
+    """This thread's initialized tesserocr engine, or None when tesserocr can't be used."""
+    global _fallback_reason
+    if TESSERACT_BACKEND == "pytesseract" or _fallback_reason is not None:
+        return None
+    api = getattr(_local, "api", None)
+    if api is None:
+        try:
+            from tesserocr import PyTessBaseAPI
+            api = PyTessBaseAPI(lang=TESSERACT_LANG)
+        except Exception as e:
+            if TESSERACT_BACKEND == "tesserocr":
+                raise RuntimeError(f"TESSERACT_BACKEND=tesserocr but the engine could not start: {e}") from e
+            _fallback_reason = f"{type(e).__name__}: {e}"
+            print(f"tesserocr unavailable ({_fallback_reason}); using pytesseract")
+            return None
+        _local.api = api
+    return api
+
+
+def image_to_data(image, config=""):
+    """Word boxes and confidences in pytesseract's ``Output.DICT`` layout.
+
+    With tesserocr, each thread keeps its own initialized engine (language
+    model loaded once) and the pixels are handed over from memory. Otherwise
+    this is ``pytesseract.image_to_data``, which runs the ``tesseract``
+    executable on a temporary file; configs with options other than
+    ``--psm`` always take that path.
+    """
+    psm = parse_psm(config)
+    api = _engine() if psm is not False else None
+    if api is None:
+        return pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+
+    from tesserocr import PSM
+
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    bytes_per_pixel = 1 if image.mode == "L" else 3
+    try:
+        api.SetPageSegMode(PSM.AUTO if psm is None else psm)
+        api.SetImageBytes(image.tobytes(), image.width, image.height, bytes_per_pixel,
+                          image.width * bytes_per_pixel)
+        tsv = api.GetTSVText(0)
+    finally:
+        api.Clear()
+    return parse_tsv(tsv)
+
+
+def parse_tsv(tsv):
+    data = {column: [] for column in TSV_COLUMNS}
+    for line in (tsv or "").splitlines():
+        fields = line.split("\t")
+        if len(fields) < len(TSV_COLUMNS) - 1:
+            continue
+        fields += [""] * (len(TSV_COLUMNS) - len(fields))
+        for column, value in zip(TSV_COLUMNS[:10], fields):
+            data[column].append(int(value))
+        data["conf"].append(float(fields[10]))
+        data["text"].append(fields[11])
+    return data
@@ -1,9 +1,8 @@
 import streamlit as st
-import requests
 import pandas as pd
 import json
 
-API_URL = "http://127.0.0.1:8000"
+import ui_client
 
 st.set_page_config(page_title="NutriScan – Food Label Analyzer", layout="wide")
 
@@ -73,6 +72,62 @@ with st.sidebar:
     st.markdown("---")
     st.caption("NutriScan v2.0 • Enhanced Analysis")
 
+def render_ocr_preview(raw_text, cleaned_ingredients):
+    with st.expander(" OCR Extracted Text Preview", expanded=False):
+        st.text_area("Raw OCR Text", value=raw_text, height=150)
+        st.write("Cleaned Ingredients:", cleaned_ingredients)
+
+
+def render_detected_product(detected):
+    if detected and detected != "Unknown":
+        st.markdown(f'<h2 class="sub-header"> Detected Product: {detected.title()}</h2>', unsafe_allow_html=True)
+
+
+def analyze(uploaded_file, profile, progress, ocr_slot, product_slot):
+    """The analysis of the uploaded image for ``profile``. Returns (result, error).
+
+    A label the API has already analyzed is only rescored (memoized per
+    profile); otherwise the image is uploaded to the streaming endpoint and
+    each stage is rendered as it arrives.
+    """
+    contents = uploaded_file.getvalue()
+    try:
+        result = ui_client.rescore(ui_client.label_id(contents), profile)
+    except ui_client.LabelNotCached:
+        pass
+    else:
+        with ocr_slot.container():
+            render_ocr_preview(result.get("ocr_preview", {}).get("raw_text", ""), result.get("ingredients", []))
+        with product_slot.container():
+            render_detected_product(result.get("detected_product"))
+        return result, None
+
+    progress.info("Analyzing image...")
+    raw_text = ""
+
+    def on_event(event):
+        nonlocal raw_text
+        stage = event.get("stage")
+        if stage == "ocr":
+            raw_text = event.get("text", "")
+            progress.info("Text extracted — cleaning ingredients...")
+        elif stage == "ingredients":
+            progress.info("Ingredients found — detecting product...")
+            with ocr_slot.container():
+                render_ocr_preview(raw_text, event.get("ingredients", []))
+        elif stage == "product":
+            progress.info("Product detected — running nutrition entity recognition...")
+            with product_slot.container():
+                render_detected_product(event.get("detected_product"))
+        elif stage == "entities":
+            progress.info("Entities recognized — scoring...")
+
+    try:
+        return ui_client.stream_analysis(uploaded_file.name, contents, uploaded_file.type, profile, on_event)
+    finally:
+        progress.empty()
+
+
 uploaded_file = st.file_uploader(" Upload Label Image", type=["jpg", "jpeg", "png"])
 
 if uploaded_file is not None:
@@ -82,36 +137,25 @@ if uploaded_file is not None:
         st.image(uploaded_file, caption="Uploaded Image", use_container_width=True)
     
     with col2:
-        with st.spinner("Analyzing image..."):
-            files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-            data = {
-                "gender": gender,
-                "age": age,
-                "weight": weight,
-                "height": height,
-                "diet": diet,
-                "allergies": allergies
-            }
-            try:
-                response = requests.post(f"{API_URL}/analyze", files=files, data=data, timeout=30)
-            except Exception as e:
-                st.error(f" Request failed: {e}")
-                response = None
-
-    if response and response.status_code == 200:
-        result = response.json()
-        
-        with st.expander(" OCR Extracted Text Preview", expanded=False):
-            if "ocr_preview" in result:
-                st.text_area("Raw OCR Text", value=result["ocr_preview"].get("raw_text", ""), height=150)
-                st.write("Cleaned Ingredients:", result["ocr_preview"].get("cleaned_ingredients", []))
-            else:
-                st.info("No OCR preview available")
+        progress = st.empty()
 
-        detected = result.get("detected_product", "Unknown")
-        if detected != "Unknown":
-            st.markdown(f'<h2 class="sub-header"> Detected Product: {detected.title()}</h2>', unsafe_allow_html=True)
-        
+    ocr_slot = st.empty()
+    product_slot = st.empty()
+
+    profile = {
+        "gender": gender,
+        "age": age,
+        "weight": weight,
+        "height": height,
+        "diet": diet,
+        "allergies": allergies
+    }
+    try:
+        result, error = analyze(uploaded_file, profile, progress, ocr_slot, product_slot)
+    except Exception as e:
+        result, error = None, f"Request failed: {e}"
+
+    if result is not None:
         analysis = result.get("analysis", {})
         hs = analysis.get("health_score", {})
         score = hs.get("score") if isinstance(hs, dict) else hs
@@ -221,14 +265,12 @@ if uploaded_file is not None:
         st.markdown("---")
         col1, col2 = st.columns([3, 1])
         with col2:
-            if st.button(" Download Full Report (JSON)"):
-                st.download_button(
-                    label="Download JSON",
-                    data=json.dumps(result, indent=2),
-                    file_name="nutriscan_report.json",
-                    mime="application/json"
-                )
+            st.download_button(
+                label=" Download Full Report (JSON)",
+                data=json.dumps(result, indent=2),
+                file_name="nutriscan_report.json",
+                mime="application/json"
+            )
 
     else:
-        if response is not None:
-            st.error(f" API Error: {response.text}")
+        st.error(f" API Error: {error}")
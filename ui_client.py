@@ -0,0 +1,76 @@
+"""HTTP client for the Streamlit UI.
+
+Streamlit re-runs the whole script on every widget change, so the UI must
+not talk to the API directly from the script body. Here one pooled
+``requests.Session`` is shared by all reruns and sessions, and rescoring
+results are memoized per (label, profile). An image is uploaded and
+analyzed once; after that, a sidebar change costs one small /rescore call,
+and returning to a profile already shown costs no request at all.
+"""
+import hashlib
+import json
+import os
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+API_URL = os.getenv("NUTRISCAN_API_URL", "http://127.0.0.1:8000")
+POOL_SIZE = 8
+CONNECT_TIMEOUT = 10
+ANALYZE_TIMEOUT = 60
+RESCORE_TIMEOUT = 15
+
+
+class LabelNotCached(Exception):
+    """The API no longer holds this label's OCR output; it has to be analyzed again."""
+
+
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def label_id(contents: bytes) -> str:
+    """The API's label id: the SHA-256 of the image bytes."""
+    return hashlib.sha256(contents).hexdigest()
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def rescore(label_id: str, profile: dict):
+    """The analysis of a label the API has seen, for ``profile``.
+
+    Memoized on (label_id, profile). Raises LabelNotCached when the API
+    returns 404; exceptions are not cached, so the next call asks again.
+    """
+    response = get_session().post(f"{API_URL}/rescore", data={"label_id": label_id, **profile},
+                                  timeout=(CONNECT_TIMEOUT, RESCORE_TIMEOUT))
+    if response.status_code == 404:
+        raise LabelNotCached(label_id)
+    response.raise_for_status()
+    return response.json()
+
+
+def stream_analysis(filename, contents, mime_type, profile, on_event):
+    """Upload an image to /analyze/stream, calling ``on_event(event)`` for each
+    stage as it arrives. Returns (result, error)."""
+    files = {"file": (filename, contents, mime_type)}
+    with get_session().post(f"{API_URL}/analyze/stream", files=files, data=profile, stream=True,
+                            timeout=(CONNECT_TIMEOUT, ANALYZE_TIMEOUT)) as response:
+        if response.status_code != 200:
+            return None, response.text
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            stage = event.get("stage")
+            if stage == "result":
+                return event.get("result"), None
+            if stage == "error":
+                return None, event.get("detail", "Unknown error")
+            on_event(event)
+    return None, "Analysis stream ended unexpectedly"
@@ -0,0 +1,122 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+OCR_WORKERS = env_int("OCR_WORKERS", os.cpu_count() or 1)
+OCR_EXECUTOR = os.getenv("OCR_EXECUTOR", "process")
+NER_WORKERS = env_int("NER_WORKERS", 1)
+MAX_PENDING = env_int("MAX_PENDING", OCR_WORKERS * 4)
+
+
+class WorkerPools:
+    """OCR and NER executors plus admission control for the request handlers.
+
+    OCR (Tesseract/EasyOCR) runs in a process pool by default so it scales with
+    cores; the NER model runs in a small thread pool since torch releases the
+    GIL. Requests beyond ``max_pending`` in flight are rejected with a 503.
+    ``ocr_initializer(*ocr_initargs)`` runs in each OCR process as it starts.
+    If an OCR process dies (OOM kill, a crash in native code), the broken pool
+    is replaced with a new one and the job is retried once on it; a job that
+    breaks the new pool too fails only its own request.
+    """
+
+    def __init__(self, ocr_workers=OCR_WORKERS, ocr_executor=OCR_EXECUTOR,
+                 ner_workers=NER_WORKERS, max_pending=MAX_PENDING):
+        if ocr_executor not in ("process", "thread"):
+            raise ValueError(f"OCR_EXECUTOR must be 'process' or 'thread', got {ocr_executor!r}")
+        self.ocr_workers = ocr_workers
+        self.ocr_executor = ocr_executor
+        self.ner_workers = ner_workers
+        self.max_pending = max_pending
+        self.ocr_initializer = None
+        self.ocr_initargs = ()
+        self.pending = 0
+        self.ocr_restarts = 0
+        self._ocr_pool = None
+        self._ner_pool = None
+
+    def ocr_pool(self):
+        if self._ocr_pool is None:
+            if self.ocr_executor == "process":
+                self._ocr_pool = ProcessPoolExecutor(max_workers=self.ocr_workers, initializer=self.ocr_initializer,
+                                                     initargs=self.ocr_initargs)
+            else:
+                self._ocr_pool = ThreadPoolExecutor(max_workers=self.ocr_workers, thread_name_prefix="ocr")
+        return self._ocr_pool
+
+    def ner_pool(self):
+        if self._ner_pool is None:
+            self._ner_pool = ThreadPoolExecutor(max_workers=self.ner_workers, thread_name_prefix="ner")
+        return self._ner_pool
+
+    def shutdown(self):
+        for pool in (self._ocr_pool, self._ner_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._ocr_pool = self._ner_pool = None
+
+    def try_acquire(self):
+        if self.pending >= self.max_pending:
+            return False
+        self.pending += 1
+        return True
+
+    def acquire(self):
+        if not self.try_acquire():
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+    def release(self):
+        self.pending -= 1
+
+    def hold(self):
+        """Acquire a slot and return a function that releases it; calling it again is a no-op."""
+        self.acquire()
+        held = [True]
+
+        def release():
+            if held[0]:
+                held[0] = False
+                self.release()
+        return release
+
+    @asynccontextmanager
+    async def admit(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _replace_broken(self, pool):
+        # Every request that was running on the broken pool gets here; only the first replaces it.
+        if self._ocr_pool is pool:
+            self._ocr_pool = None
+            self.ocr_restarts += 1
+            pool.shutdown(wait=False, cancel_futures=True)
+            print("OCR process pool broke (a worker process died); starting a new one")
+
+    async def run_ocr(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = self.ocr_pool()
+            try:
+                return await loop.run_in_executor(pool, fn, *args)
+            except BrokenProcessPool:
+                self._replace_broken(pool)
+                if attempt:
+                    raise HTTPException(status_code=503, detail="OCR worker crashed, please retry",
+                                        headers={"Retry-After": "1"})